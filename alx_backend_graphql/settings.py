@@ -2,6 +2,8 @@
 
 from pathlib import Path
 
+from crm_project.db import database_settings, replica_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,6 +34,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crm.routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,15 +58,23 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'crm_project.wsgi.application'
+ASGI_APPLICATION = 'crm_project.asgi.application'
 
-# Database
+# Database: SQLite (WAL) by default, PostgreSQL with DB_ENGINE=postgres
+# (see crm_project/db/__init__.py for the environment variables)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(BASE_DIR),
+    **replica_settings(BASE_DIR),
 }
 
+# GraphQL queries read from the DB_REPLICAS, everything else from default
+# (see crm/routing.py)
+DATABASE_ROUTERS = ['crm.routing.ReplicaRouter']
+CRM_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+CRM_DB_REPLICA_MAX_LAG = 5
+CRM_DB_REPLICA_CHECK_INTERVAL = 10
+CRM_DB_PIN_SECONDS = 10
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,252 @@
+"""Time-bucketed sales aggregates computed in the database.
+
+``sales_stats()`` groups orders by day, week or month with ``Trunc*`` /
+``Count`` / ``Sum``. Closed buckets (ending before now and fully inside the
+requested range) never change, so with ``CRM_SALES_STATS_CACHE`` on they are
+cached and only the open bucket and partial edge buckets are recomputed.
+Writes that touch a closed bucket (back-dated orders, cleanup,
+reconciliation) call ``invalidate_sales_stats()``, which bumps the cache
+version.
+
+The version only changes in the cache the writer sees. Closed buckets are
+kept without expiry when ``CRM_SALES_STATS_CACHE_ALIAS`` names a cache shared
+by all processes (e.g. Redis). With a process-local ``LocMemCache``, other
+processes never see the bump, so buckets expire after
+``CRM_SALES_STATS_CACHE_TTL`` seconds.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from graphql import GraphQLError
+
+from crm.models import Customer, Order
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+TRUNC_FUNCTIONS = {DAY: TruncDay, WEEK: TruncWeek, MONTH: TruncMonth}
+
+DEFAULT_BUCKETS = 30
+MAX_BUCKETS = 1000
+DEFAULT_TOP_CUSTOMERS = 10
+MAX_TOP_CUSTOMERS = 100
+
+CACHE_PREFIX = 'crm:sales:'
+DEFAULT_CACHE_TTL = 300
+VERSION_KEY = CACHE_PREFIX + 'version'
+ZERO = Decimal('0.00')
+
+
+def _aware(moment):
+    if timezone.is_naive(moment):
+        return timezone.make_aware(moment)
+    return moment
+
+
+def bucket_start(moment, group_by):
+    """Start of the local day, ISO week or month containing ``moment``"""
+    local = timezone.make_naive(_aware(moment))
+    start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if group_by == WEEK:
+        start -= timedelta(days=start.weekday())
+    elif group_by == MONTH:
+        start = start.replace(day=1)
+    return timezone.make_aware(start)
+
+
+def next_bucket(start, group_by):
+    local = timezone.make_naive(start)
+    if group_by == DAY:
+        local += timedelta(days=1)
+    elif group_by == WEEK:
+        local += timedelta(days=7)
+    else:
+        year, month = divmod(local.month, 12)
+        local = local.replace(year=local.year + year, month=month + 1)
+    return timezone.make_aware(local)
+
+
+def previous_bucket(start, group_by):
+    return bucket_start(timezone.make_naive(start) - timedelta(days=1), group_by)
+
+
+def buckets(start, end, group_by):
+    """``[(bucket_start, bucket_end), ...]`` covering ``[start, end)``"""
+    result = []
+    current = bucket_start(start, group_by)
+    while current < end:
+        following = next_bucket(current, group_by)
+        result.append((current, following))
+        if len(result) > MAX_BUCKETS:
+            raise GraphQLError(f"salesStats is limited to {MAX_BUCKETS} buckets, narrow the range.")
+        current = following
+    return result
+
+
+def is_cache_enabled():
+    return getattr(settings, 'CRM_SALES_STATS_CACHE', False)
+
+
+def get_cache():
+    return caches[getattr(settings, 'CRM_SALES_STATS_CACHE_ALIAS', 'default')]
+
+
+def _closed_timeout(cache):
+    """No expiry in a shared cache; a per-process one misses other processes' invalidations"""
+    if isinstance(cache, LocMemCache):
+        return getattr(settings, 'CRM_SALES_STATS_CACHE_TTL', DEFAULT_CACHE_TTL)
+    return None
+
+
+def get_cache_version(cache):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def invalidate_sales_stats():
+    """Forget every cached bucket, e.g. after a back-dated write"""
+    if not is_cache_enabled():
+        return
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 2, timeout=None)
+
+
+def _bucket_key(group_by, status, start):
+    return f"{CACHE_PREFIX}{group_by}:{status or '*'}:{start.isoformat()}"
+
+
+def _filtered_orders(start, end, status=None):
+    queryset = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def compute_buckets(group_by, start, end, status=None):
+    """``{bucket_start: (orders, revenue)}`` for orders in ``[start, end)``, one query"""
+    trunc = TRUNC_FUNCTIONS[group_by]
+    rows = (
+        _filtered_orders(start, end, status)
+        .order_by()
+        .annotate(bucket=trunc('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('bucket')
+        .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+    )
+    return {_aware(row['bucket']): (row['orders'], row['revenue'] or ZERO) for row in rows}
+
+
+def sales_stats(group_by=DAY, start=None, end=None, status=None):
+    """Return ``[{'period_start', 'period_end', 'order_count', 'revenue'}, ...]``"""
+    if group_by not in TRUNC_FUNCTIONS:
+        raise GraphQLError(f"Unknown groupBy: {group_by}")
+    now = timezone.now()
+    end = _aware(end) if end else now
+    if start:
+        start = _aware(start)
+    else:
+        start = bucket_start(end, group_by)
+        for _ in range(DEFAULT_BUCKETS - 1):
+            start = previous_bucket(start, group_by)
+    if start >= end:
+        return []
+    status = status.lower() if status else None
+
+    periods = buckets(start, end, group_by)
+    cacheable, values = {}, {}
+    if is_cache_enabled():
+        cache = get_cache()
+        version = get_cache_version(cache)
+        cacheable = {
+            _bucket_key(group_by, status, bucket): bucket
+            for bucket, bucket_end in periods
+            if bucket >= start and bucket_end <= end and bucket_end <= now
+        }
+        values = {
+            cacheable[key]: value
+            for key, value in cache.get_many(list(cacheable), version=version).items()
+        }
+
+    missing = [(bucket, bucket_end) for bucket, bucket_end in periods if bucket not in values]
+    if missing:
+        # One grouped query over the span of the buckets not in the cache
+        computed = compute_buckets(
+            group_by,
+            max(missing[0][0], start),
+            min(missing[-1][1], end),
+            status,
+        )
+        fresh = {}
+        for bucket, _ in missing:
+            values[bucket] = computed.get(bucket, (0, ZERO))
+            key = _bucket_key(group_by, status, bucket)
+            if key in cacheable:
+                fresh[key] = values[bucket]
+        if fresh:
+            cache.set_many(fresh, timeout=_closed_timeout(cache), version=version)
+
+    return [
+        {
+            'period_start': max(bucket, start),
+            'period_end': min(bucket_end, end),
+            'order_count': values[bucket][0],
+            'revenue': values[bucket][1],
+        }
+        for bucket, bucket_end in periods
+    ]
+
+
+def top_customers(limit=DEFAULT_TOP_CUSTOMERS, start=None, end=None):
+    """Return the ``limit`` customers with the highest revenue in ``[start, end)``.
+
+    Ranges that ended in the past are cached like closed buckets.
+    """
+    if limit <= 0 or limit > MAX_TOP_CUSTOMERS:
+        raise GraphQLError(f"limit must be between 1 and {MAX_TOP_CUSTOMERS}.")
+    start = _aware(start) if start else None
+    end = _aware(end) if end else None
+    closed = end is not None and end <= timezone.now()
+
+    key = ranking = None
+    if closed and is_cache_enabled():
+        cache = get_cache()
+        version = get_cache_version(cache)
+        key = f"{CACHE_PREFIX}top:{limit}:{start.isoformat() if start else '*'}:{end.isoformat()}"
+        ranking = cache.get(key, version=version)
+
+    if ranking is None:
+        queryset = Order.objects.all()
+        if start:
+            queryset = queryset.filter(created_at__gte=start)
+        if end:
+            queryset = queryset.filter(created_at__lt=end)
+        ranking = list(
+            queryset.order_by()
+            .values('customer_id')
+            .annotate(order_count=Count('pk'), revenue=Sum('total_amount'))
+            .order_by('-revenue', 'customer_id')[:limit]
+        )
+        if key:
+            cache.set(key, ranking, timeout=_closed_timeout(cache), version=version)
+
+    customers = Customer.objects.in_bulk([row['customer_id'] for row in ranking])
+    return [
+        {
+            'customer': customers[row['customer_id']],
+            'order_count': row['order_count'],
+            'revenue': row['revenue'] or ZERO,
+        }
+        for row in ranking
+        if row['customer_id'] in customers
+    ]
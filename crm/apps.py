@@ -1,7 +1,24 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
-    verbose_name = 'Customer Relationship Management'
\ No newline at end of file
+    verbose_name = 'Customer Relationship Management'
+
+    def ready(self):
+        # Connects the cache invalidation and CRM summary signals
+        from crm import invalidation, summary  # noqa: F401
+        from crm.response_cache import check_settings
+        from crm.search import install_after_migrate
+        from crm.tracing import install_sql_hook
+
+        # Table rebuilds during migrations drop the SQLite search triggers
+        post_migrate.connect(install_after_migrate, sender=self)
+        # Lets traced GraphQL requests time their SQL per field
+        connection_created.connect(install_sql_hook)
+        # Rejects an enabled response cache without a Redis URL
+        checks.register(check_settings)
@@ -0,0 +1,114 @@
+"""Concurrent execution of query root fields for the ASGI GraphQL view.
+
+Django's async ORM (``aget``, ``acount``, ``async for``) still runs every
+query through ``sync_to_async``, on the one thread of the current request,
+so two root fields awaiting the ORM would simply queue up behind each other.
+``AsyncExecutionContext`` therefore runs each root field after the first on
+a thread of its own (``FieldThread``), passed to ``sync_to_async`` as its
+executor: the field's resolver, its nested fields (loaders, lazy relations),
+connection and queries are its own, and independent fields such as
+``lowStockProducts`` and ``allCustomers`` hit the database at the same time.
+
+The first root field stays on the request's thread. It resolves with
+``Query.aresolve_<field>`` when the schema defines one (a coroutine using the
+async ORM) and with the regular resolver otherwise; nested fields are then
+completed on that thread, never on the event loop. The other root fields
+always use their regular resolver: the async ORM would send their queries
+back to the request's thread.
+
+Field threads are kept for the next request, up to
+``GRAPHQL_ASYNC_IDLE_THREADS`` idle ones, and so are their connections: like
+a request, a field closes them before and after it runs only when
+``CONN_MAX_AGE`` has expired or they broke.
+"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from graphene.utils.str_converters import to_snake_case
+from graphql import ExecutionContext, located_error
+from graphql.execution.execute import get_argument_values, get_field_def
+
+ASYNC_RESOLVER_PREFIX = 'aresolve_'
+DEFAULT_IDLE_THREADS = 16
+
+_idle_threads = queue.LifoQueue()
+
+
+def get_async_resolver(parent_type, field_name):
+    """``aresolve_<field>`` of the graphene type behind ``parent_type``"""
+    graphene_type = getattr(parent_type, 'graphene_type', None)
+    if graphene_type is None:
+        return None
+    return getattr(graphene_type, ASYNC_RESOLVER_PREFIX + to_snake_case(field_name), None)
+
+
+class FieldThread:
+    """A pooled thread for the sync code of one root field"""
+
+    def __enter__(self):
+        try:
+            self.executor = _idle_threads.get_nowait()
+        except queue.Empty:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='graphql-field')
+        # One worker: this runs before anything the field submits
+        self.executor.submit(close_old_connections)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.submit(close_old_connections)
+        if _idle_threads.qsize() < getattr(settings, 'GRAPHQL_ASYNC_IDLE_THREADS', DEFAULT_IDLE_THREADS):
+            _idle_threads.put(self.executor)
+        else:
+            self.executor.submit(connections.close_all)
+            self.executor.shutdown(wait=False)
+
+    def sync_to_async(self, func):
+        """``func`` as a coroutine function running on this thread, in the caller's context"""
+        return sync_to_async(func, thread_sensitive=False, executor=self.executor)
+
+
+class AsyncExecutionContext(ExecutionContext):
+    """Resolve the root fields of an operation concurrently, one thread each"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root_fields = 0
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        self.root_fields += 1
+        if self.root_fields == 1:
+            # The first one keeps the request's own thread
+            return self.execute_root_field(parent_type, source, field_nodes, path)
+        return self.execute_on_field_thread(parent_type, source, field_nodes, path)
+
+    async def execute_on_field_thread(self, parent_type, source, field_nodes, path):
+        with FieldThread() as field_thread:
+            execute_field = field_thread.sync_to_async(super().execute_field)
+            return await execute_field(parent_type, source, field_nodes, path)
+
+    async def execute_root_field(self, parent_type, source, field_nodes, path):
+        resolver = get_async_resolver(parent_type, field_nodes[0].name.value)
+        if resolver is None:
+            return await sync_to_async(super().execute_field)(parent_type, source, field_nodes, path)
+
+        field_def = get_field_def(self.schema, parent_type, field_nodes[0])
+        return_type = field_def.type
+        if self.middleware_manager:
+            resolver = self.middleware_manager.get_field_resolver(resolver)
+        info = self.build_resolve_info(field_def, field_nodes, parent_type, path)
+        try:
+            args = get_argument_values(field_def, field_nodes[0], self.variable_values)
+            result = resolver(source, info, **args)
+            if self.is_awaitable(result):
+                result = await result
+            # Sub-selections may still load relations: not on the event loop
+            return await sync_to_async(self.complete_value)(return_type, field_nodes, info, path, result)
+        except Exception as raw_error:
+            error = located_error(raw_error, field_nodes, path.as_list())
+            self.handle_field_error(error, return_type, path)
+            return None
@@ -1,14 +1,15 @@
 import os
 import django
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from gql import gql
 from gql.transport.exceptions import TransportError
 
 # Set up Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm_project.settings')
 django.setup()
 
+from crm.graphql_client import get_client
+
 def log_crm_heartbeat():
     """
     Log a heartbeat message to confirm CRM application health.
@@ -24,13 +25,8 @@ def log_crm_heartbeat():
     # Optional GraphQL health check
     graphql_status = ""
     try:
-        # Initialize GraphQL client
-        transport = RequestsHTTPTransport(
-            url='http://localhost:8000/graphql',
-            headers={'Content-Type': 'application/json'},
-            timeout=5  # 5 second timeout
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
+        # Initialize GraphQL client (in-process unless CRM_GRAPHQL_TRANSPORT = 'http')
+        client = get_client(timeout=5)  # 5 second timeout over HTTP
         
         # Simple query to test GraphQL endpoint
         query = gql("""
@@ -83,13 +79,8 @@ def update_low_stock():
     timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
     
     try:
-        # Initialize GraphQL client
-        transport = RequestsHTTPTransport(
-            url='http://localhost:8000/graphql',
-            headers={'Content-Type': 'application/json'},
-            timeout=30  # 30 second timeout for mutation
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=False)
+        # Initialize GraphQL client (in-process unless CRM_GRAPHQL_TRANSPORT = 'http')
+        client = get_client(timeout=30)  # 30 second timeout for mutation over HTTP
         
         # Define the UpdateLowStockProducts mutation
         mutation = gql("""
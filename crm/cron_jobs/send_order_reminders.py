@@ -3,9 +3,8 @@
 import os
 import sys
 import django
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from datetime import datetime, timedelta, timezone
+from gql import gql
 import logging
 
 # Add the project root to Python path
@@ -15,6 +14,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm_project.settings')
 django.setup()
 
+from crm.graphql_client import get_client
+
 def setup_logging():
     """Set up logging configuration"""
     logging.basicConfig(
@@ -26,48 +27,63 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 def get_graphql_client():
-    """Initialize GraphQL client"""
-    transport = RequestsHTTPTransport(
-        url='http://localhost:8000/graphql',
-        headers={'Content-Type': 'application/json'}
-    )
-    return Client(transport=transport, fetch_schema_from_transport=True)
+    """Initialize GraphQL client (in-process unless CRM_GRAPHQL_TRANSPORT = 'http')"""
+    return get_client()
+
+PAGE_SIZE = 100
+
 
 def get_pending_orders_query():
-    """GraphQL query to get orders from the last 7 days"""
+    """GraphQL query to get one page of orders created since a given date"""
     return gql("""
-        query GetRecentOrders {
-            allOrders {
-                id
-                orderNumber
-                totalAmount
-                status
-                createdAt
-                customer {
-                    id
-                    email
-                    firstName
-                    lastName
+        query GetRecentOrders($createdAfter: DateTime!, $first: Int!, $after: String) {
+            allOrders(createdAfter: $createdAfter, first: $first, after: $after) {
+                edges {
+                    node {
+                        id
+                        orderNumber
+                        totalAmount
+                        status
+                        createdAt
+                        customer {
+                            id
+                            email
+                            firstName
+                            lastName
+                        }
+                    }
+                }
+                pageInfo {
+                    hasNextPage
+                    endCursor
                 }
             }
         }
     """)
 
-def filter_recent_orders(orders):
-    """Filter orders from the last 7 days"""
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_orders = []
-    
-    for order in orders:
-        # Parse the created_at timestamp
-        try:
-            order_date = datetime.fromisoformat(order['createdAt'].replace('Z', '+00:00'))
-            if order_date.replace(tzinfo=None) >= seven_days_ago:
-                recent_orders.append(order)
-        except (ValueError, KeyError) as e:
-            continue
+def execute_query(client, query, variables):
+    """Execute a query with variables on gql 3 (document) and gql 4 (request)"""
+    if hasattr(query, 'variable_values'):
+        query.variable_values = variables
+        return client.execute(query)
+    return client.execute(query, variable_values=variables)
+
+def iter_recent_orders(client, days=7, page_size=PAGE_SIZE):
+    """Yield orders from the last ``days`` days, fetching one page at a time"""
+    created_after = datetime.now(timezone.utc) - timedelta(days=days)
+    query = get_pending_orders_query()
+    variables = {'createdAfter': created_after.isoformat(), 'first': page_size, 'after': None}
     
-    return recent_orders
+    while True:
+        result = execute_query(client, query, variables)
+        connection = result['allOrders']
+        for edge in connection['edges']:
+            yield edge['node']
+        
+        page_info = connection['pageInfo']
+        if not page_info['hasNextPage']:
+            break
+        variables['after'] = page_info['endCursor']
 
 def send_order_reminders():
     """Main function to process order reminders"""
@@ -77,18 +93,9 @@ def send_order_reminders():
         # Initialize GraphQL client
         client = get_graphql_client()
         
-        # Execute query
-        query = get_pending_orders_query()
-        result = client.execute(query)
-        
-        # Get all orders
-        all_orders = result.get('allOrders', [])
-        
-        # Filter orders from the last 7 days
-        recent_orders = filter_recent_orders(all_orders)
-        
-        # Log each order
-        for order in recent_orders:
+        # Orders are filtered by date on the server and streamed page by page
+        processed = 0
+        for order in iter_recent_orders(client):
             customer = order.get('customer', {})
             customer_email = customer.get('email', 'No email')
             order_id = order.get('id')
@@ -97,9 +104,10 @@ def send_order_reminders():
             
             log_message = f"Order ID: {order_id}, Order Number: {order_number}, Status: {status}, Customer Email: {customer_email}"
             logger.info(log_message)
+            processed += 1
         
         # Log summary
-        summary_message = f"Processed {len(recent_orders)} orders from the last 7 days"
+        summary_message = f"Processed {processed} orders from the last 7 days"
         logger.info(summary_message)
         
         # Print to console
@@ -0,0 +1,93 @@
+"""Shared cache of single rows behind the entity loaders.
+
+The request-scoped tier is the ``BatchLoader`` identity map in
+``crm/loaders.py``. This module is the second tier, shared between requests
+through the Django cache named by ``CRM_ENTITY_CACHE_ALIAS`` (a process LRU
+with the default ``LocMemCache``, Redis once ``CACHES`` points there).
+
+Keys are versioned twice: by a fingerprint of the model's columns, so a
+deploy that changes a model never unpickles old rows, and by a per-model
+generation that ``invalidate(model)`` bumps to drop every row at once. A
+saved row is replaced by a short-lived tombstone instead of being deleted,
+and rows are only ever stored with ``add()``, so a request that read the row
+before the write cannot put the old version back.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DEFAULT_TTL = 60
+KEY_PREFIX = 'crm:entity:'
+TOMBSTONE = '__deleted__'
+TOMBSTONE_TTL = 10
+
+
+def is_enabled():
+    return getattr(settings, 'CRM_ENTITY_CACHE', False)
+
+
+def get_cache():
+    return caches[getattr(settings, 'CRM_ENTITY_CACHE_ALIAS', 'default')]
+
+
+@lru_cache(maxsize=None)
+def _model_key(model):
+    columns = ','.join(field.attname for field in model._meta.concrete_fields)
+    fingerprint = hashlib.sha256(columns.encode('utf-8')).hexdigest()[:8]
+    return f"{KEY_PREFIX}{model._meta.label_lower}:{fingerprint}"
+
+
+def _generation(cache, model):
+    return cache.get_or_set(_model_key(model) + ':generation', 1, timeout=None)
+
+
+def _keys(cache, model, pks):
+    prefix = f"{_model_key(model)}:{_generation(cache, model)}:"
+    return {prefix + str(pk): pk for pk in pks}
+
+
+def load(model, pks):
+    """Batch function: primary keys -> rows (None when missing), in order"""
+    if not is_enabled():
+        rows = model._default_manager.in_bulk(pks)
+        return [rows.get(pk) for pk in pks]
+
+    cache = get_cache()
+    keys = _keys(cache, model, pks)
+    rows = {
+        keys[key]: value
+        for key, value in cache.get_many(list(keys)).items()
+        if value != TOMBSTONE
+    }
+    missing = [pk for pk in pks if pk not in rows]
+    if missing:
+        fetched = model._default_manager.in_bulk(missing)
+        ttl = getattr(settings, 'CRM_ENTITY_CACHE_TTL', DEFAULT_TTL)
+        for key, pk in keys.items():
+            if pk in fetched:
+                cache.add(key, fetched[pk], timeout=ttl)
+        rows.update(fetched)
+    return [rows.get(pk) for pk in pks]
+
+
+def _invalidate_now(model, pks):
+    cache = get_cache()
+    if pks is None:
+        key = _model_key(model) + ':generation'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 2, timeout=None)
+    else:
+        cache.set_many(dict.fromkeys(_keys(cache, model, pks), TOMBSTONE), timeout=TOMBSTONE_TTL)
+
+
+def invalidate(model, pks=None):
+    """Forget rows ``pks`` of ``model`` (every row when ``pks`` is None)"""
+    if not is_enabled():
+        return
+    pks = None if pks is None else list(pks)
+    transaction.on_commit(lambda: _invalidate_now(model, pks))
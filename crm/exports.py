@@ -0,0 +1,225 @@
+"""Bulk exports of customers and orders to gzip-compressed files.
+
+An export is split into date partitions on ``created_at`` (one per day, week
+or month) so partitions can be written by parallel Celery workers, see
+``crm.tasks.export_crm_data``. Each partition is read with
+``.iterator(chunk_size)`` (a server-side cursor on PostgreSQL), written to a
+temporary file and renamed into place once complete:
+
+    <CRM_EXPORT_DIR>/<kind>/<period>/<kind>-<partition start>.<csv|ndjson>.gz
+
+A partition file therefore only exists once it has been fully written, and a
+rerun skips it. Only closed partitions (ending before now or before ``end``)
+are exported, since later orders would still change them; the one left out
+is returned by ``open_partition()`` so callers can report it. When ``start``
+falls inside a period, the first partition starts at ``start`` and its file
+is named after the exact time and marked ``.partial``, so it never stands in
+for the whole period on a later run.
+"""
+import csv
+import gzip
+import os
+import tempfile
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Min
+from django.utils import timezone
+
+from crm.analytics import DAY, MONTH, WEEK, bucket_start, next_bucket
+from crm.models import Customer, Order
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+PERIODS = (DAY, WEEK, MONTH)
+DEFAULT_CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'customers': (Customer, [
+        'id', 'first_name', 'last_name', 'email', 'phone', 'address',
+        'is_active', 'created_at', 'updated_at',
+    ]),
+    'orders': (Order, [
+        'id', 'order_number', 'customer_id', 'status', 'total_amount',
+        'notes', 'created_at', 'updated_at',
+    ]),
+}
+# Orders also carry the ids of their products
+PRODUCT_IDS = 'product_ids'
+
+export_encoder = DjangoJSONEncoder()
+
+
+def parse_datetime(value):
+    """Aware datetime from a datetime or an ISO string (task arguments are JSON)"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def get_export_dir():
+    export_dir = getattr(settings, 'CRM_EXPORT_DIR', None)
+    return Path(export_dir or Path(tempfile.gettempdir()) / 'crm_exports')
+
+
+def _check(kind, fmt, period):
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown export period: {period}")
+
+
+def columns(kind):
+    _, fields = EXPORTS[kind]
+    return fields + [PRODUCT_IDS] if kind == 'orders' else list(fields)
+
+
+def _split(kind, start, end, period):
+    """``(closed partitions, partition left out or None)`` for ``[start, end)``"""
+    model, _ = EXPORTS[kind]
+    now = timezone.now()
+    start, end = parse_datetime(start), parse_datetime(end)
+    end = min(end, now) if end else now
+    if start is None:
+        start = model.objects.aggregate(start=Min('created_at'))['start']
+        if start is None:
+            return [], None
+        current = bucket_start(start, period)
+    else:
+        # Rows before an explicit start are not part of the export
+        current = start
+    result = []
+    while current < end:
+        following = next_bucket(bucket_start(current, period), period)
+        if following > end:
+            return result, (current, end)
+        result.append((current, following))
+        current = following
+    return result, None
+
+
+def partitions(kind, start=None, end=None, period=DAY):
+    """``[(start, end), ...]`` of the closed partitions covering ``[start, end)``.
+
+    ``start`` defaults to the oldest row and ``end`` to now; the partition
+    still open at ``end`` is left out (see ``open_partition()``).
+    """
+    return _split(kind, start, end, period)[0]
+
+
+def open_partition(kind, start=None, end=None, period=DAY):
+    """``(start, end)`` of the part of ``[start, end)`` that ``partitions()`` leaves out"""
+    return _split(kind, start, end, period)[1]
+
+
+def partition_path(kind, fmt, period, start):
+    local = timezone.localtime(start)
+    if start == bucket_start(start, period):
+        name = f"{kind}-{local.date().isoformat()}.{fmt}.gz"
+    else:
+        name = f"{kind}-{local.strftime('%Y-%m-%dT%H-%M-%S')}.partial.{fmt}.gz"
+    return get_export_dir() / kind / period / name
+
+
+def _csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    return value
+
+
+def iter_rows(kind, start, end):
+    """Yield the rows of ``kind`` created in ``[start, end)`` as dicts, in chunks"""
+    model, fields = EXPORTS[kind]
+    chunk_size = getattr(settings, 'CRM_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    rows = (
+        model.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .order_by('created_at', 'id')
+        .values(*fields)
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        if kind == 'orders':
+            # One query per chunk for the product lists
+            product_ids = {row['id']: [] for row in chunk}
+            links = (
+                Order.products.through.objects
+                .filter(order_id__in=list(product_ids))
+                .order_by('order_id', 'product_id')
+                .values_list('order_id', 'product_id')
+            )
+            for order_id, product_id in links:
+                product_ids[order_id].append(product_id)
+            for row in chunk:
+                row[PRODUCT_IDS] = product_ids[row['id']]
+        yield chunk
+
+
+def write_partition(kind, fmt, start, end, path):
+    """Write one partition to ``path`` and return the number of rows"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    count = 0
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as export_file:
+            if fmt == CSV:
+                writer = csv.writer(export_file)
+                writer.writerow(columns(kind))
+            for chunk in iter_rows(kind, start, end):
+                if fmt == CSV:
+                    writer.writerows(
+                        [_csv_value(value) for value in row.values()] for row in chunk
+                    )
+                else:
+                    export_file.write(''.join(export_encoder.encode(row) + '\n' for row in chunk))
+                count += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def export_partition(kind, fmt, start, end, period=DAY, overwrite=False):
+    """Export one partition unless its file already exists.
+
+    Returns ``{'path', 'rows', 'skipped'}``; ``rows`` is None when skipped.
+    """
+    _check(kind, fmt, period)
+    start, end = parse_datetime(start), parse_datetime(end)
+    path = partition_path(kind, fmt, period, start)
+    if path.exists() and not overwrite:
+        return {'path': str(path), 'rows': None, 'skipped': True}
+    rows = write_partition(kind, fmt, start, end, path)
+    return {'path': str(path), 'rows': rows, 'skipped': False}
+
+
+def export(kind, fmt=CSV, start=None, end=None, period=DAY, overwrite=False, progress=None):
+    """Export every closed partition of ``kind`` in ``[start, end)`` in turn.
+
+    ``progress(done, total, result)`` is called after each partition.
+    """
+    _check(kind, fmt, period)
+    results = []
+    pending = partitions(kind, start, end, period)
+    for partition_start, partition_end in pending:
+        result = export_partition(kind, fmt, partition_start, partition_end, period, overwrite)
+        results.append(result)
+        if progress is not None:
+            progress(len(results), len(pending), result)
+    return results
@@ -1,12 +1,27 @@
 import django_filters
 from django_filters import FilterSet
 from .models import Customer
+from .search import MIN_TRIGRAM_LENGTH, search_customers, terms
 
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    email = django_filters.CharFilter(lookup_expr='icontains')
-    
+    # Indexed search on the normalized name/email/phone (see crm/search.py)
+    name = django_filters.CharFilter(method='filter_search')
+    search = django_filters.CharFilter(method='filter_search')
+    email = django_filters.CharFilter(method='filter_email')
+
     class Meta:
         model = Customer
-        fields = ['name', 'email']
\ No newline at end of file
+        fields = ['name', 'search', 'email']
+
+    def filter_search(self, queryset, name, value):
+        return search_customers(queryset, value)
+
+    def filter_email(self, queryset, name, value):
+        # The search index narrows the rows on the terms it matches as substrings
+        # (short terms only match word prefixes there), icontains keeps the
+        # email-only semantics
+        long_terms = [term for term in terms(value) if len(term) >= MIN_TRIGRAM_LENGTH]
+        if long_terms:
+            queryset = search_customers(queryset, ' '.join(long_terms))
+        return queryset.filter(email__icontains=value)
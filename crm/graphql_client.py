@@ -0,0 +1,202 @@
+"""GraphQL clients for the cron jobs and Celery workers.
+
+The jobs already run inside a Django process, so by default documents are
+executed in-process against ``crm.schema.schema`` through
+``LocalSchemaTransport``: no JSON round trip, no socket and no introspection
+download, and no web worker is tied up. Set ``CRM_GRAPHQL_TRANSPORT = 'http'``
+to go through ``CRM_GRAPHQL_URL`` instead, e.g. to probe a remote server.
+
+Sessions are shared per process: over HTTP they reuse one keep-alive
+connection pool. Failed connections are retried with exponential backoff;
+a request that reached the server is never sent again, since a mutation may
+already have been applied when the response timed out or failed.
+"""
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpRequest
+from gql import Client
+from gql.transport import Transport
+from gql.transport.requests import RequestsHTTPTransport
+from graphql import ExecutionResult, execute, print_schema, validate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_GRAPHQL_URL = 'http://localhost:8000/graphql/'
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 4
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class LocalSchemaTransport(Transport):
+    """gql transport executing documents directly against a graphene schema"""
+
+    def __init__(self, schema=None):
+        self.schema = schema
+
+    def connect(self):
+        if self.schema is None:
+            from crm.schema import schema
+            self.schema = schema
+
+    def execute(self, request, *args, variable_values=None, operation_name=None, **kwargs):
+        # gql >= 4 passes a GraphQLRequest, gql 3 passes the DocumentNode
+        document = getattr(request, 'document', request)
+        if hasattr(request, 'variable_values'):
+            variable_values = request.variable_values
+            operation_name = request.operation_name
+
+        graphql_schema = self.schema.graphql_schema
+        errors = validate(graphql_schema, document)
+        if errors:
+            result = ExecutionResult(data=None, errors=errors)
+        else:
+            result = execute(
+                graphql_schema,
+                document,
+                context_value=HttpRequest(),
+                variable_values=variable_values,
+                operation_name=operation_name,
+            )
+        # Same shape as a JSON response: errors are plain dicts
+        return ExecutionResult(
+            data=result.data,
+            errors=[error.formatted for error in result.errors] if result.errors else None,
+            extensions=result.extensions,
+        )
+
+    def close(self):
+        pass
+
+
+class PooledRequestsHTTPTransport(RequestsHTTPTransport):
+    """HTTP transport whose session keeps a pool of keep-alive connections"""
+
+    def __init__(self, url, pool_maxsize=DEFAULT_POOL_SIZE, **kwargs):
+        self.pool_maxsize = pool_maxsize
+        super().__init__(url, **kwargs)
+
+    def connect(self):
+        super().connect()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            # Only connection errors: the POST has not reached the server yet
+            max_retries=Retry(
+                total=self.retries,
+                connect=self.retries,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=self.retry_backoff_factor,
+                allowed_methods=None,
+            ),
+        )
+        for prefix in 'http://', 'https://':
+            self.session.mount(prefix, adapter)
+
+
+def get_transport_name():
+    return getattr(settings, 'CRM_GRAPHQL_TRANSPORT', 'local')
+
+
+def schema_hash():
+    """Hash of the schema this code base serves, used to key cached introspection"""
+    from crm.schema import schema
+
+    return hashlib.sha256(print_schema(schema.graphql_schema).encode('utf-8')).hexdigest()
+
+
+def schema_cache_path():
+    cache_dir = getattr(settings, 'CRM_GRAPHQL_SCHEMA_CACHE_DIR', None) or tempfile.gettempdir()
+    return Path(cache_dir) / f"crm_graphql_schema_{schema_hash()[:16]}.json"
+
+
+def load_cached_introspection():
+    try:
+        with open(schema_cache_path(), encoding='utf-8') as schema_file:
+            return json.load(schema_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_introspection(introspection):
+    path = schema_cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent jobs never read a partial file
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as schema_file:
+            json.dump(introspection, schema_file)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def build_http_client(timeout, fetch_schema=False):
+    transport = PooledRequestsHTTPTransport(
+        url=getattr(settings, 'CRM_GRAPHQL_URL', DEFAULT_GRAPHQL_URL),
+        headers={'Content-Type': 'application/json'},
+        timeout=timeout,
+        retries=getattr(settings, 'CRM_GRAPHQL_RETRIES', DEFAULT_RETRIES),
+        retry_backoff_factor=getattr(settings, 'CRM_GRAPHQL_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF),
+        pool_maxsize=getattr(settings, 'CRM_GRAPHQL_POOL_SIZE', DEFAULT_POOL_SIZE),
+    )
+    introspection = load_cached_introspection() if fetch_schema else None
+    client = Client(
+        transport=transport,
+        introspection=introspection,
+        fetch_schema_from_transport=fetch_schema and introspection is None,
+    )
+    return client
+
+
+def get_client(transport=None, timeout=None, fetch_schema=False):
+    """Return a connected, process-wide shared GraphQL session.
+
+    The returned session has the same ``execute()`` as a gql ``Client``. Over
+    HTTP it keeps its keep-alive connection pool between calls, and with
+    ``fetch_schema`` the introspection result is cached on disk per schema
+    hash instead of being downloaded on every run.
+    """
+    transport = transport or get_transport_name()
+    timeout = timeout or getattr(settings, 'CRM_GRAPHQL_TIMEOUT', DEFAULT_TIMEOUT)
+    key = (transport, timeout, fetch_schema)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None:
+            return session
+
+        if transport == 'local':
+            client = Client(transport=LocalSchemaTransport(), fetch_schema_from_transport=False)
+        elif transport == 'http':
+            client = build_http_client(timeout, fetch_schema=fetch_schema)
+        else:
+            raise ValueError(f"Unknown GraphQL transport: {transport}")
+
+        session = client.connect_sync()
+        if fetch_schema and client.introspection is not None and transport == 'http':
+            save_cached_introspection(client.introspection)
+        _sessions[key] = session
+        return session
+
+
+def close_clients():
+    """Close every shared session (registered to run at interpreter exit)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.client.close_sync()
+        _sessions.clear()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,43 @@
+"""Invalidate the response cache and the entity cache on writes.
+
+Saves and deletes through the ORM are picked up by the signals below.
+Writes that bypass them (``bulk_create``, ``update()``, raw deletes) call
+``invalidate()`` directly.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from crm import entity_cache, response_cache
+from crm.models import Customer, Order, Product
+
+
+def invalidate(model, pks=None):
+    """Invalidate cached data built from rows ``pks`` of ``model``.
+
+    Without ``pks`` every row of the model is invalidated.
+    """
+    response_cache.invalidate(model, pks)
+    entity_cache.invalidate(model, pks)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Product)
+def invalidate_instance(sender, instance, **kwargs):
+    invalidate(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products(sender, instance, action, pk_set=None, **kwargs):
+    # Only the responses embed the relation, cached rows do not change
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Order):
+        response_cache.invalidate(Order, [instance.pk])
+        response_cache.invalidate(Product, pk_set or ())
+    else:
+        response_cache.invalidate(Product, [instance.pk])
+        response_cache.invalidate(Order, pk_set or ())
@@ -0,0 +1,115 @@
+"""Set-based stock updates for products"""
+from django.db import connections, router, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from crm.models import Product
+from crm.invalidation import invalidate
+
+LOW_STOCK_THRESHOLD = 10
+RESTOCK_AMOUNT = 10
+
+
+def supports_update_returning(connection):
+    """PostgreSQL and SQLite >= 3.35 can return rows from an UPDATE"""
+    return (
+        connection.vendor in ('postgresql', 'sqlite')
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+def restock_low_stock(threshold=LOW_STOCK_THRESHOLD, amount=RESTOCK_AMOUNT):
+    """Add ``amount`` to every product with ``stock < threshold``.
+
+    The increment happens in a single ``UPDATE ... SET stock = stock + n``
+    statement, so concurrent stock changes are never overwritten, and the
+    updated rows are returned without scanning the table again.
+    """
+    now = timezone.now()
+    # A raw() queryset would be routed like a read, possibly to a replica
+    using = router.db_for_write(Product)
+    with transaction.atomic(using=using):
+        if supports_update_returning(connections[using]):
+            products = _restock_returning(connections[using], threshold, amount, now)
+        else:
+            ids = list(
+                Product.objects.using(using).select_for_update()
+                .filter(stock__lt=threshold)
+                .values_list('pk', flat=True)
+            )
+            Product.objects.using(using).filter(pk__in=ids).update(
+                stock=F('stock') + amount, updated_at=now,
+            )
+            products = list(Product.objects.using(using).filter(pk__in=ids))
+    invalidate(Product, [product.pk for product in products])
+    products.sort(key=lambda product: (product.name, product.pk))
+    return products
+
+
+def _restock_returning(connection, threshold, amount, now):
+    opts = Product._meta
+    qn = connection.ops.quote_name
+    stock = qn(opts.get_field('stock').column)
+    updated_at = opts.get_field('updated_at')
+    fields = opts.concrete_fields
+    columns = ', '.join(qn(field.column) for field in fields)
+    sql = (
+        f"UPDATE {qn(opts.db_table)} "
+        f"SET {stock} = {stock} + %s, {qn(updated_at.column)} = %s "
+        f"WHERE {stock} < %s "
+        f"RETURNING {columns}"
+    )
+    params = [amount, updated_at.get_db_prep_value(now, connection), threshold]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    converters = connection.ops.get_db_converters
+    field_names = [field.attname for field in fields]
+    products = []
+    for row in rows:
+        values = []
+        for field, value in zip(fields, row):
+            expression = field.get_col(opts.db_table)
+            for converter in converters(expression) + expression.get_db_converters(connection):
+                value = converter(value, expression, connection)
+            values.append(value)
+        products.append(Product.from_db(connection.alias, field_names, values))
+    return products
+
+
+def reserve_stock(quantities):
+    """Take ``{product_id: quantity}`` out of stock, all or nothing.
+
+    One conditional ``UPDATE ... WHERE stock >= quantity`` covers the whole
+    cart, so two orders can never both take the last unit. Returns the ids of
+    the products without enough stock; nothing is reserved in that case.
+    """
+    if not quantities:
+        return []
+    quantity = Case(
+        *[When(pk=pk, then=Value(amount)) for pk, amount in quantities.items()],
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        updated = (
+            Product.objects
+            .filter(pk__in=list(quantities), stock__gte=quantity)
+            .update(stock=F('stock') - quantity, updated_at=timezone.now())
+        )
+        if updated == len(quantities):
+            invalidate(Product, list(quantities))
+            return []
+        transaction.set_rollback(True)
+    return list(
+        Product.objects
+        .filter(pk__in=list(quantities), stock__lt=quantity)
+        .values_list('pk', flat=True)
+    )
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(
+            "Insufficient stock for product ID: " + ', '.join(str(pk) for pk in self.product_ids)
+        )
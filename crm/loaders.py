@@ -0,0 +1,173 @@
+"""Per-request batch loaders used by the GraphQL resolvers.
+
+GraphQL resolves list items one by one, so resolving ``customer`` and
+``products`` on every order in ``allOrders`` would issue one query per order.
+Root resolvers queue the keys of the rows they return and the first nested
+lookup then fetches all queued keys with a single ``IN`` query.
+
+Single-entity lookups (``customer``, ``order``, ``product`` and the nested
+``customer`` of orders) go through the same loaders, whose cache is the
+request identity map, backed by the shared tier in ``crm/entity_cache.py``.
+Root lookups queue the ids of all their aliases, so
+``a: product(id: 1) b: product(id: 2)`` costs one query.
+"""
+import threading
+from collections import defaultdict
+
+from graphql.language import FieldNode, InlineFragmentNode
+from graphql.utilities import value_from_ast_untyped
+
+from crm import entity_cache
+from crm.models import Customer, Order, Product
+
+
+class BatchLoader:
+    """Resolve keys in batches and cache the results for one request"""
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._queue = {}
+        # Root fields of the ASGI view resolve on several threads at once
+        self._lock = threading.RLock()
+
+    def prime(self, key, value):
+        """Store an already known value so it is never fetched"""
+        self._cache.setdefault(key, value)
+        self._queue.pop(key, None)
+
+    def queue(self, keys):
+        """Remember keys that are likely to be loaded later in the request"""
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._queue[key] = None
+
+    def load(self, key):
+        """Return the value for ``key``, fetching every queued key at once"""
+        with self._lock:
+            if key not in self._cache:
+                self.queue([key])
+                self.dispatch()
+            return self._cache.get(key, self.default)
+
+    def load_many(self, keys):
+        keys = list(keys)
+        with self._lock:
+            self.queue(keys)
+            self.dispatch()
+            return [self._cache.get(key, self.default) for key in keys]
+
+    def dispatch(self):
+        with self._lock:
+            keys = list(self._queue)
+            self._queue.clear()
+            if not keys:
+                return
+            for key, value in zip(keys, self.batch_load_fn(keys)):
+                self._cache[key] = value
+
+    def clear(self, key=None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+def load_customers(keys):
+    """Batch function: customer ids -> customers"""
+    return entity_cache.load(Customer, keys)
+
+
+def load_orders(keys):
+    return entity_cache.load(Order, keys)
+
+
+def load_products(keys):
+    return entity_cache.load(Product, keys)
+
+
+def load_order_products(keys):
+    """Batch function: order ids -> list of products, in product ordering"""
+    products_by_order = defaultdict(list)
+    rows = (
+        Order.products.through.objects
+        .filter(order_id__in=keys)
+        .select_related('product')
+        .order_by('product__name', 'product_id')
+    )
+    for row in rows:
+        products_by_order[row.order_id].append(row.product)
+    return [products_by_order[key] for key in keys]
+
+
+class Loaders:
+    """All batch loaders for a single GraphQL request"""
+
+    def __init__(self):
+        self.customers = BatchLoader(load_customers)
+        self.orders = BatchLoader(load_orders)
+        self.products = BatchLoader(load_products)
+        self.order_products = BatchLoader(load_order_products, default=[])
+        self._queued_lookups = set()
+
+    def lookup(self, loader, info, key):
+        """Load ``key`` for a root ``field(id: ...)``, batching every alias"""
+        lookup = (id(info.operation), info.field_name)
+        if info.path.prev is None and lookup not in self._queued_lookups:
+            self._queued_lookups.add(lookup)
+            ids = root_lookup_ids(info)
+            rows = loader.load_many(ids)
+            if loader is self.orders:
+                # Aliases resolve one after the other: queue all their relations now
+                self.queue_orders([order for order in rows if order is not None])
+        return loader.load(key)
+
+    def queue_orders(self, orders):
+        """Queue the relations of ``orders`` so siblings are fetched together"""
+        for order in orders:
+            if Order.customer.is_cached(order):
+                self.customers.prime(order.customer_id, order.customer)
+            elif 'customer_id' not in order.get_deferred_fields():
+                # A deferred column means the customer was not selected
+                self.customers.queue([order.customer_id])
+            prefetched = getattr(order, '_prefetched_objects_cache', {})
+            if 'products' in prefetched:
+                self.order_products.prime(order.pk, list(prefetched['products']))
+            else:
+                self.order_products.queue([order.pk])
+        return orders
+
+
+def root_lookup_ids(info, argument_name='id'):
+    """``id`` arguments of every root field named like the current one"""
+    ids = []
+    selections = list(info.operation.selection_set.selections)
+    while selections:
+        selection = selections.pop(0)
+        if isinstance(selection, InlineFragmentNode):
+            selections.extend(selection.selection_set.selections)
+        elif isinstance(selection, FieldNode) and selection.name.value == info.field_name:
+            for argument in selection.arguments:
+                if argument.name.value == argument_name:
+                    value = value_from_ast_untyped(argument.value, info.variable_values)
+                    if isinstance(value, int):
+                        ids.append(value)
+    return ids
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request context"""
+    context = info.context
+    if isinstance(context, dict):
+        return context.setdefault('crm_loaders', Loaders())
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        try:
+            context.crm_loaders = loaders
+        except AttributeError:
+            # No mutable context (e.g. schema.execute() without one): the
+            # loaders only live for this lookup and batching is lost.
+            pass
+    return loaders
@@ -0,0 +1,113 @@
+"""Load-test the GraphQL endpoint under WSGI and ASGI at equal concurrency.
+
+The WSGI run drives ``/graphql/`` through Django's WSGI handler from
+``--workers`` threads, like a threaded WSGI server. The ASGI run drives
+``/graphql/async/`` through Django's ASGI handler from ``--workers``
+concurrent requests on one event loop, like one ASGI server worker. Both
+keep the same number of requests in flight.
+"""
+import asyncio
+import time
+from statistics import median, quantiles
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+from .benchmark_graphql import Command as GraphQLBenchmarkCommand
+
+# Independent root fields, which the ASGI view resolves concurrently
+DEFAULT_QUERY = (
+    '{ lowStockProducts { id name stock } '
+    'allCustomers(first: 20) { edges { node { id firstName lastName email } } } '
+    'allOrders(first: 10) { edges { node { orderNumber totalAmount customer { email } } } } }'
+)
+
+
+class Command(GraphQLBenchmarkCommand):
+    help = "Benchmark /graphql/ under WSGI against /graphql/async/ under ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per run (default: 1000)")
+        parser.add_argument('--workers', type=int, default=8,
+                            help="WSGI threads and concurrent ASGI requests (default: 8)")
+        parser.add_argument('--query', default=DEFAULT_QUERY, help="GraphQL document to send")
+        parser.add_argument('--wsgi-path', default='/graphql/')
+        parser.add_argument('--asgi-path', default='/graphql/async/')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        runs = (
+            (f"WSGI {options['wsgi_path']} ({workers} threads)",
+             lambda: self.run({**options, 'threads': workers, 'path': options['wsgi_path']})),
+            (f"ASGI {options['asgi_path']} ({workers} concurrent requests)",
+             lambda: asyncio.run(self.run_asgi({**options, 'path': options['asgi_path']}, workers))),
+        )
+        for label, run in runs:
+            stats = run()
+            self.stdout.write(
+                f"{label}: {stats['rps']:.0f} req/s, p50 {stats['p50'] * 1000:.2f}ms, "
+                f"p99 {stats['p99'] * 1000:.2f}ms"
+            )
+
+    def scope(self, options):
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.')
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': options['path'],
+            'raw_path': options['path'].encode(),
+            'query_string': urlencode({'query': options['query']}).encode(),
+            'root_path': '',
+            'headers': [(b'host', host.encode()), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+
+    async def request(self, handler, scope):
+        received = False
+        disconnected = asyncio.Event()
+        statuses = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The client stays connected until the response is sent
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        await handler(dict(scope), receive, send)
+        disconnected.set()
+        if statuses != [200]:
+            raise RuntimeError(f"{scope['path']} answered {statuses}")
+
+    async def run_asgi(self, options, workers):
+        handler = ASGIHandler()
+        scope = self.scope(options)
+        per_worker = max(1, options['requests'] // workers)
+        latencies = []
+
+        async def worker():
+            for _ in range(per_worker):
+                started = time.perf_counter()
+                await self.request(handler, scope)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50': median(latencies),
+            'p99': quantiles(latencies, n=100)[-1],
+        }
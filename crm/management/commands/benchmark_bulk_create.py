@@ -0,0 +1,89 @@
+"""Benchmark ``bulkCreateCustomers`` against the former row-by-row import.
+
+Both variants import the same generated customers. The row-by-row variant
+runs what the mutation used to run, an ``exists()`` and a ``create()`` per
+customer. The mutation is executed in-process against the schema. Every run
+is rolled back, so the database is left unchanged.
+"""
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.core.validators import validate_email
+from django.db import connection, transaction
+
+from crm.models import Customer
+from crm.schema import schema, split_name
+
+DEFAULT_SIZES = '100,1000,10000'
+MUTATION = '''
+mutation Import($input: [CustomerInput]!) {
+  bulkCreateCustomers(input: $input) { errors message }
+}
+'''
+
+
+def generate_customers(count):
+    prefix = uuid.uuid4().hex[:8]
+    return [
+        {'name': f'Bench Customer{index}', 'email': f'bench-{prefix}-{index}@example.com',
+         'phone': '+1234567890'}
+        for index in range(count)
+    ]
+
+
+def import_row_by_row(customers):
+    for customer in customers:
+        validate_email(customer['email'])
+        if Customer.objects.filter(email=customer['email']).exists():
+            continue
+        first_name, last_name = split_name(customer['name'])
+        Customer.objects.create(
+            first_name=first_name, last_name=last_name,
+            email=customer['email'], phone=customer['phone'],
+        )
+
+
+def import_with_mutation(customers):
+    result = schema.execute(MUTATION, variable_values={'input': customers})
+    if result.errors:
+        raise result.errors[0]
+    errors = result.data['bulkCreateCustomers']['errors']
+    if errors:
+        raise RuntimeError(errors[0])
+
+
+class Command(BaseCommand):
+    help = "Benchmark bulkCreateCustomers against one INSERT per customer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                            help=f"Comma-separated import sizes (default: {DEFAULT_SIZES})")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        for size in sizes:
+            for label, run in (('row by row', import_row_by_row),
+                               ('bulkCreateCustomers', import_with_mutation)):
+                queries, elapsed = self.measure(run, generate_customers(size))
+                self.stdout.write(
+                    f"{size:>6} customers, {label:<20} {queries:>6} queries, "
+                    f"{elapsed * 1000:>8.1f}ms, {size / elapsed:>8.0f} rows/s"
+                )
+
+    @staticmethod
+    def measure(run, customers):
+        """``(SQL statements, seconds)`` for one import, rolled back afterwards"""
+        statements = []
+
+        def count(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                run(customers)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return len(statements), elapsed
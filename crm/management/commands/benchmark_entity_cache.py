@@ -0,0 +1,101 @@
+"""Benchmark alias-heavy lookups through the entity loaders and cache.
+
+Builds one document with ``--aliases`` ``product(id)`` lookups and one with
+as many ``order(id) { customer { email } }`` lookups, then executes each
+in-process:
+
+* with the former resolvers, one ``.get()`` per alias and per customer;
+* through the request loaders only (``CRM_ENTITY_CACHE = False``);
+* with the shared tier on, cold (just invalidated) and warm.
+
+Reports the SQL statements per request and the best time of ``--runs``.
+"""
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from crm import entity_cache
+from crm.models import Customer, Order, Product
+from crm.schema import schema
+
+
+class Command(BaseCommand):
+    help = "Benchmark product(id)/order(id) alias batches with and without the entity cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aliases', type=int, default=50, help="Lookups per document (default: 50)")
+        parser.add_argument('--runs', type=int, default=20, help="Runs per variant, best is kept (default: 20)")
+
+    def handle(self, *args, **options):
+        aliases, runs = options['aliases'], options['runs']
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:aliases])
+        order_ids = list(Order.objects.values_list('pk', flat=True)[:aliases])
+        if not product_ids or not order_ids:
+            raise CommandError("Needs products and orders in the database")
+
+        cases = (
+            (f'{len(product_ids)} x product(id)', Product, product_ids,
+             '{ %s }' % ' '.join(
+                 f'p{index}: product(id: {pk}) {{ id name stock price }}'
+                 for index, pk in enumerate(product_ids))),
+            (f'{len(order_ids)} x order(id) {{ customer {{ email }} }}', Order, order_ids,
+             '{ %s }' % ' '.join(
+                 f'o{index}: order(id: {pk}) {{ id orderNumber customer {{ email }} }}'
+                 for index, pk in enumerate(order_ids))),
+        )
+        for label, model, pks, document in cases:
+            self.stdout.write(label)
+            with self.former_resolvers():
+                self.report('one .get() per alias', runs, lambda: self.run_document(document))
+            with override_settings(CRM_ENTITY_CACHE=False):
+                self.report('request loaders', runs, lambda: self.run_document(document))
+            with override_settings(CRM_ENTITY_CACHE=True):
+                self.report('shared tier, cold', runs, lambda: self.run_document(document),
+                            before=lambda: [entity_cache.invalidate(m) for m in (Product, Order, Customer)])
+                self.report('shared tier, warm', runs, lambda: self.run_document(document))
+
+    @staticmethod
+    def former_resolvers():
+        """Swap the loader-backed resolvers for the ``.get()`` ones they replaced"""
+        graphql_schema = schema.graphql_schema
+        query = graphql_schema.query_type.fields
+        stack = ExitStack()
+        for field_name, model in (('product', Product), ('order', Order)):
+            stack.enter_context(mock.patch.object(
+                query[field_name], 'resolve',
+                lambda root, info, id, model=model: model.objects.get(pk=id),
+            ))
+        stack.enter_context(mock.patch.object(
+            graphql_schema.get_type('OrderType').fields['customer'], 'resolve',
+            lambda order, info: order.customer,
+        ))
+        return stack
+
+    @staticmethod
+    def run_document(document):
+        result = schema.execute(document, context_value=RequestFactory().post('/graphql/'))
+        if result.errors:
+            raise CommandError(result.errors[0])
+
+    def report(self, label, runs, run, before=None):
+        best, statements = None, []
+
+        def count(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(runs):
+            if before is not None:
+                before()
+            statements.clear()
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f"  {label:<22} {len(statements):>4} queries, best {best * 1000:7.2f}ms")
@@ -0,0 +1,134 @@
+"""Load-test ``/graphql/`` in-process and compare per-request connection setup.
+
+Requests go through Django's WSGI handler, so ``request_started`` /
+``request_finished`` close or keep database connections exactly as under a
+threaded WSGI server. The same load runs once with ``CONN_MAX_AGE = 0`` (a
+new connection per request) and once with persistent connections.
+"""
+import io
+import sys
+import threading
+import time
+from statistics import median, quantiles
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DEFAULT_QUERY = '{ allProducts(first: 10) { edges { node { id name price stock } } } }'
+DEFAULT_PERSISTENT_MAX_AGE = 60
+
+
+class Command(BaseCommand):
+    help = "Benchmark /graphql/ with and without persistent database connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per run (default: 1000)")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent threads (default: 4)")
+        parser.add_argument('--query', default=DEFAULT_QUERY, help="GraphQL document to send")
+        parser.add_argument('--path', default='/graphql/')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        settings_dict = connections.settings[alias]
+        configured = settings_dict['CONN_MAX_AGE']
+        persistent = configured if configured != 0 else DEFAULT_PERSISTENT_MAX_AGE
+
+        setup = self.connection_setup_time(alias)
+        self.stdout.write(
+            f"{settings_dict['ENGINE']}: opening a connection takes {setup * 1000:.2f}ms"
+        )
+        try:
+            for label, max_age in (('before (CONN_MAX_AGE=0)', 0),
+                                   (f'after (CONN_MAX_AGE={persistent})', persistent)):
+                settings_dict['CONN_MAX_AGE'] = max_age
+                stats = self.run(options)
+                self.stdout.write(
+                    f"{label}: {stats['rps']:.0f} req/s, "
+                    f"p50 {stats['p50'] * 1000:.2f}ms, p95 {stats['p95'] * 1000:.2f}ms, "
+                    f"{stats['connections']} connections opened "
+                    f"({stats['connections'] / stats['requests']:.2f} per request, "
+                    f"~{stats['connections'] * setup / stats['requests'] * 1000:.2f}ms each)"
+                )
+        finally:
+            settings_dict['CONN_MAX_AGE'] = configured
+
+    def connection_setup_time(self, alias, samples=50):
+        connection = connections[alias]
+        connection.close()
+        started = time.perf_counter()
+        for _ in range(samples):
+            connection.connect()
+            connection.close()
+        return (time.perf_counter() - started) / samples
+
+    def environ(self, options):
+        return {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': options['path'],
+            'QUERY_STRING': urlencode({'query': options['query']}),
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.'),
+            'HTTP_ACCEPT': 'application/json',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    def run(self, options):
+        handler = WSGIHandler()
+        threads = max(1, options['threads'])
+        per_thread = max(1, options['requests'] // threads)
+        latencies = []
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        def worker():
+            timings = []
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                response = handler(self.environ(options), lambda status, headers: None)
+                try:
+                    b''.join(response)
+                finally:
+                    # Sends request_finished, which closes or keeps the connection
+                    response.close()
+                timings.append(time.perf_counter() - started)
+            connections.close_all()
+            with lock:
+                latencies.extend(timings)
+
+        connection_created.connect(count_connection)
+        try:
+            started = time.perf_counter()
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+
+        return {
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50': median(latencies),
+            'p95': quantiles(latencies, n=20)[-1],
+            'p99': quantiles(latencies, n=100)[-1],
+            'connections': len(opened),
+        }
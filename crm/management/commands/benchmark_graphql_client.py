@@ -0,0 +1,97 @@
+"""Benchmark the per-call latency of the cron/worker GraphQL clients.
+
+Compares what the jobs used to do on every call, a fresh gql ``Client``
+with and without a schema introspection download, against the shared
+pooled session from ``crm.graphql_client.get_client()`` and the in-process
+``local`` transport.
+
+Without ``--url``, ``/graphql/`` is served from this process by Django's
+threaded development server (HTTP/1.1 keep-alive, ``TCP_NODELAY`` set so
+reused connections do not stall on delayed ACKs). Like the test client, it
+skips the CSRF check the gql transports cannot pass.
+"""
+import socket
+import threading
+import time
+from statistics import median
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test.utils import override_settings
+from gql import Client, gql
+from gql.transport.requests import RequestsHTTPTransport
+
+from crm import graphql_client
+
+DEFAULT_QUERY = '{ hello }'
+
+
+class BenchmarkHandler(WSGIHandler):
+    def get_response(self, request):
+        request._dont_enforce_csrf_checks = True
+        return super().get_response(request)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Compare fresh GraphQL clients per call with the shared pooled session"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=50, help="Calls per variant (default: 50)")
+        parser.add_argument('--query', default=DEFAULT_QUERY, help="GraphQL document to send")
+        parser.add_argument('--url', help="GraphQL endpoint (default: serve /graphql/ in-process)")
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if url is None:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            server.set_app(BenchmarkHandler())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_port}/graphql/'
+
+        document = gql(options['query'])
+
+        def fresh_client(fetch_schema):
+            def call():
+                transport = RequestsHTTPTransport(url=url, timeout=graphql_client.DEFAULT_TIMEOUT)
+                client = Client(transport=transport, fetch_schema_from_transport=fetch_schema)
+                with client as session:
+                    return session.execute(document)
+            return call
+
+        variants = (
+            ('fresh Client + introspection', fresh_client(True)),
+            ('fresh Client, no schema', fresh_client(False)),
+            ('pooled session, cached schema', lambda: graphql_client.get_client(
+                'http', fetch_schema=True).execute(document)),
+            ('local transport', lambda: graphql_client.get_client('local').execute(document)),
+        )
+        try:
+            with override_settings(CRM_GRAPHQL_URL=url, ALLOWED_HOSTS=['127.0.0.1', 'localhost']):
+                for label, call in variants:
+                    # Warm up: connects the shared sessions and caches the schema
+                    call()
+                    timings = []
+                    for _ in range(options['calls']):
+                        started = time.perf_counter()
+                        call()
+                        timings.append(time.perf_counter() - started)
+                    self.stdout.write(
+                        f"{label:<32} median {median(timings) * 1000:7.2f}ms, "
+                        f"min {min(timings) * 1000:7.2f}ms"
+                    )
+        finally:
+            graphql_client.close_clients()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
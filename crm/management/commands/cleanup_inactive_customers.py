@@ -0,0 +1,116 @@
+"""Delete customers without any order in the last ``--days`` days, in batches"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from crm.models import CRMSummary, Customer, Order
+from crm.invalidation import invalidate
+from crm.summary import CUSTOMERS, apply_deltas, queryset_order_deltas
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_DAYS = 365
+
+
+def inactive_customers(since):
+    """Customers with no order since ``since`` (``NOT EXISTS`` anti-join)"""
+    recent_orders = Order.objects.filter(customer=OuterRef('pk'), created_at__gte=since)
+    return Customer.objects.filter(~Exists(recent_orders))
+
+
+def delete_customers(ids):
+    """Delete ``ids`` and their orders with one DELETE per table.
+
+    Bypasses Django's cascade collector (which loads every related row into
+    memory and sends ``pre_delete``/``post_delete`` signals). The CRM summary
+    is decremented in the same transaction and cached GraphQL responses are
+    invalidated. Returns ``(customers, orders)``
+    deleted.
+    """
+    orders = Order.objects.filter(customer_id__in=ids)
+    deltas = queryset_order_deltas(orders, sign=-1)
+    order_products = Order.products.through.objects.filter(order_id__in=orders.values('pk'))
+    order_products._raw_delete(order_products.db)
+    order_count = orders._raw_delete(orders.db)
+    customers = Customer.objects.filter(pk__in=ids)
+    customer_count = customers._raw_delete(customers.db)
+    deltas[(CRMSummary.TOTAL, CUSTOMERS)][0] -= customer_count
+    apply_deltas(deltas)
+    invalidate(Customer, ids)
+    invalidate(Order)
+    return customer_count, order_count
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders in the last year, batch by batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=DEFAULT_DAYS,
+            help="Customers without an order in this many days are deleted (default: 365)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help="Customers deleted per transaction (default: 1000)",
+        )
+        parser.add_argument(
+            '--max-runtime', type=float, default=None,
+            help="Stop starting new batches after this many seconds",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the customers that would be deleted",
+        )
+
+    def handle(self, *args, days, batch_size, max_runtime, dry_run, **options):
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        started = time.monotonic()
+        since = timezone.now() - timedelta(days=days)
+        candidates = inactive_customers(since).order_by('pk').values_list('pk', flat=True)
+
+        customer_count = order_count = batches = 0
+        last_pk = None
+        timed_out = False
+        while True:
+            if max_runtime is not None and time.monotonic() - started >= max_runtime:
+                timed_out = True
+                break
+
+            # Walk the customer primary key so every batch is an index range scan
+            batch = candidates if last_pk is None else candidates.filter(pk__gt=last_pk)
+            ids = list(batch[:batch_size])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            batches += 1
+
+            if dry_run:
+                customer_count += len(ids)
+                continue
+
+            with transaction.atomic():
+                # Lock the batch and re-check it: an order may have come in since
+                ids = list(
+                    inactive_customers(since)
+                    .select_for_update()
+                    .filter(pk__in=ids)
+                    .values_list('pk', flat=True)
+                )
+                if ids:
+                    deleted_customers, deleted_orders = delete_customers(ids)
+                    customer_count += deleted_customers
+                    order_count += deleted_orders
+
+        if dry_run:
+            summary = f"Would clean up {customer_count} inactive customers"
+        else:
+            summary = f"Cleaned up {customer_count} inactive customers ({order_count} orders)"
+        summary += f" in {batches} batches, {time.monotonic() - started:.1f}s"
+        if timed_out:
+            summary += " (stopped at --max-runtime, run again to continue)"
+        self.stdout.write(summary)
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:34
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_summary(apps, schema_editor):
+    """Start the running totals from the existing rows"""
+    Customer = apps.get_model("crm", "Customer")
+    Order = apps.get_model("crm", "Order")
+    CRMSummary = apps.get_model("crm", "CRMSummary")
+    db = schema_editor.connection.alias
+
+    totals = defaultdict(lambda: [0, Decimal("0.00")])
+    totals[("total", "customers")][0] = Customer.objects.using(db).count()
+    totals[("total", "orders")] = [0, Decimal("0.00")]
+    rows = (
+        Order.objects.using(db)
+        .order_by()
+        .values("status", day=TruncDate("created_at"))
+        .annotate(orders=Count("pk"), revenue=Sum("total_amount"))
+    )
+    for row in rows:
+        for key in (
+            ("total", "orders"),
+            ("status", row["status"]),
+            ("day", row["day"].isoformat()),
+        ):
+            totals[key][0] += row["orders"]
+            totals[key][1] += row["revenue"] or 0
+    CRMSummary.objects.using(db).bulk_create(
+        [
+            CRMSummary(kind=kind, key=key, count=count, revenue=revenue)
+            for (kind, key), (count, revenue) in totals.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0002_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CRMSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("status", "Orders by status"),
+                            ("day", "Orders by day"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(max_length=20)),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["kind", "key"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="crmsummary",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "key"), name="crm_summary_kind_key_uniq"
+            ),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+from crm.search import (
+    customer_search_text,
+    install_search_index,
+    uninstall_search_index,
+)
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_search_text(apps, schema_editor):
+    """Fill ``search_text`` for the existing customers, in pk order"""
+    Customer = apps.get_model("crm", "Customer")
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    # A plain executemany: bulk_update() spends its time building CASE expressions
+    sql = (
+        f"UPDATE {qn(Customer._meta.db_table)} SET {qn('search_text')} = %s "
+        f"WHERE {qn('id')} = %s"
+    )
+    last_pk = 0
+    while True:
+        batch = list(
+            Customer.objects.using(connection.alias)
+            .filter(pk__gt=last_pk)
+            .order_by("pk")
+            .only("first_name", "last_name", "email", "phone")[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql,
+                [(customer_search_text(customer), customer.pk) for customer in batch],
+            )
+        last_pk = batch[-1].pk
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor.connection, rebuild=True)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0003_crm_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="search_text",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["search_text"], name="crm_customer_search_idx"),
+        ),
+        # Trigram / FTS5 index, depending on the database
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
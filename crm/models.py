@@ -1,6 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from crm.search import SEARCH_TEXT_FIELDS, customer_search_text
+
+SEARCH_TEXT_BATCH_SIZE = 2000
+
+
+class CustomerQuerySet(models.QuerySet):
+    """Keeps ``search_text`` current on the writes that bypass ``save()``"""
+
+    def update(self, **kwargs):
+        if not set(SEARCH_TEXT_FIELDS) & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            self.model._default_manager.using(self.db).filter(pk__in=pks).refresh_search_text()
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if set(SEARCH_TEXT_FIELDS) & set(fields):
+            for obj in objs:
+                obj.update_search_text()
+            fields = [*fields, 'search_text']
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+    def refresh_search_text(self):
+        """Recompute ``search_text`` of these customers, e.g. after raw SQL writes"""
+        pks = list(self.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(pks), SEARCH_TEXT_BATCH_SIZE):
+            customers = list(
+                self.model._default_manager.using(self.db)
+                .filter(pk__in=pks[start:start + SEARCH_TEXT_BATCH_SIZE])
+                .only(*SEARCH_TEXT_FIELDS)
+            )
+            for customer in customers:
+                customer.update_search_text()
+            self.bulk_update(customers, ['search_text'])
+
 
 class Customer(models.Model):
     """Customer model for CRM system"""
@@ -12,13 +49,38 @@ class Customer(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Normalized name, email and phone for crm/search.py, set by save()
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    objects = CustomerQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Default ordering and keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='crm_customer_created_idx'),
+            models.Index(
+                fields=['created_at'], name='crm_customer_active_idx',
+                condition=models.Q(is_active=True),
+            ),
+            # Prefix search (the trigram / FTS5 index is created by migration 0004)
+            models.Index(fields=['search_text'], name='crm_customer_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
+    def update_search_text(self):
+        """Refresh ``search_text``; call it before ``bulk_create()``"""
+        self.search_text = customer_search_text(self)
+
+    def save(self, *args, **kwargs):
+        self.update_search_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -45,6 +107,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Default ordering and keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='crm_order_created_idx'),
+            models.Index(fields=['customer', 'created_at'], name='crm_order_customer_idx'),
+            models.Index(fields=['status', 'created_at'], name='crm_order_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.customer.full_name}"
@@ -62,10 +130,46 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Default ordering and keyset pagination on (name, id)
+            models.Index(fields=['name', 'id'], name='crm_product_name_idx'),
+            models.Index(
+                fields=['stock'], name='crm_product_low_stock_idx',
+                condition=models.Q(stock__lt=10),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} (Stock: {self.stock})"
 
     @property
     def is_low_stock(self):
-        return self.stock < 10
\ No newline at end of file
+        return self.stock < 10
+
+
+class CRMSummary(models.Model):
+    """Running totals kept up to date on every ORM write (see crm/summary.py)"""
+    TOTAL = 'total'
+    STATUS = 'status'
+    DAY = 'day'
+    KIND_CHOICES = [
+        (TOTAL, 'Total'),
+        (STATUS, 'Orders by status'),
+        (DAY, 'Orders by day'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # 'customers' / 'orders' for totals, the status, or the ISO date
+    key = models.CharField(max_length=20)
+    count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['kind', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='crm_summary_kind_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} = {self.count} ({self.revenue})"
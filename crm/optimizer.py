@@ -0,0 +1,127 @@
+"""Shape root querysets after the GraphQL selection set.
+
+``optimize(queryset, info)`` walks the fields requested under the current
+field (fragments and inline fragments included), maps them onto the model
+and rewrites the queryset so that only the selected columns are loaded,
+forward relations are joined with ``select_related`` and many-valued
+relations are fetched with one ``prefetch_related`` query each.
+
+For example ``allOrders { orderNumber customer { email } }`` becomes
+``select_related('customer').only('order_number', 'customer__email')``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, prefetch_related_objects
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+# Relay connection plumbing that does not map onto model fields
+CONNECTION_WRAPPERS = ('edges', 'node')
+CONNECTION_META_FIELDS = ('pageInfo', 'cursor', 'totalCount', '__typename')
+
+
+def selected_fields(info, nodes):
+    """Yield the field nodes selected under ``nodes``, expanding fragments"""
+    for node in nodes:
+        if node.selection_set is None:
+            continue
+        for selection in node.selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from selected_fields(info, [selection])
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+                if fragment is not None:
+                    yield from selected_fields(info, [fragment])
+
+
+class QueryPlan:
+    """Columns and relations needed to answer a selection set"""
+
+    def __init__(self):
+        self.only = []
+        self.select_related = []
+        # path -> (queryset, extra fields, field nodes), one Prefetch per path
+        self.prefetches = {}
+
+    def add_only(self, path):
+        if path not in self.only:
+            self.only.append(path)
+
+    def add_select_related(self, path):
+        if path not in self.select_related:
+            self.select_related.append(path)
+
+    def add_prefetch(self, path, queryset, nodes, extra_fields=()):
+        """Prefetch ``path``; a relation selected twice is merged into one lookup"""
+        if path in self.prefetches:
+            self.prefetches[path][2].extend(nodes)
+        else:
+            self.prefetches[path] = (queryset, extra_fields, list(nodes))
+
+    def get_prefetch_related(self, info):
+        return [
+            Prefetch(path, queryset=optimize(queryset, info, nodes=nodes, extra_fields=extra_fields))
+            for path, (queryset, extra_fields, nodes) in self.prefetches.items()
+        ]
+
+    def apply(self, queryset, info):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*self.get_prefetch_related(info))
+        return queryset.only(*self.only)
+
+
+def build_plan(model, info, nodes, plan=None, prefix='', extra_fields=()):
+    """Collect into ``plan`` what ``nodes`` select on ``model``"""
+    plan = plan or QueryPlan()
+    plan.add_only(prefix + model._meta.pk.name)
+    for name in extra_fields:
+        plan.add_only(prefix + name)
+
+    for field_node in selected_fields(info, nodes):
+        name = field_node.name.value
+        if name in CONNECTION_META_FIELDS:
+            continue
+        if name in CONNECTION_WRAPPERS:
+            build_plan(model, info, [field_node], plan, prefix)
+            continue
+
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            # Computed field: we cannot tell which columns it reads
+            for concrete in model._meta.concrete_fields:
+                plan.add_only(prefix + concrete.name)
+            continue
+
+        path = prefix + field.name
+        if not field.is_relation:
+            plan.add_only(path)
+        elif field.concrete and (field.many_to_one or field.one_to_one):
+            plan.add_only(path)
+            plan.add_select_related(path)
+            build_plan(field.related_model, info, [field_node], plan, path + '__')
+        else:
+            # Reverse foreign keys need the back-reference column to attach
+            # the prefetched rows to their parents.
+            extra = [field.field.name] if field.one_to_many else []
+            plan.add_prefetch(path, field.related_model._default_manager.all(), [field_node], extra)
+    return plan
+
+
+def optimize(queryset, info, nodes=None, extra_fields=()):
+    """Return ``queryset`` restricted to what the current field selects"""
+    nodes = info.field_nodes if nodes is None else nodes
+    plan = build_plan(queryset.model, info, nodes, extra_fields=extra_fields)
+    return plan.apply(queryset, info)
+
+
+def prefetch_selected(instance, info):
+    """Prefetch the many-valued relations selected on an already loaded row"""
+    if instance is not None:
+        plan = build_plan(type(instance), info, info.field_nodes)
+        if plan.prefetches:
+            prefetch_related_objects([instance], *plan.get_prefetch_related(info))
+    return instance
@@ -0,0 +1,187 @@
+"""Keyset (cursor) pagination for the GraphQL connections.
+
+Pages are selected with a ``WHERE (created_at, id) < (:created_at, :id)``
+style predicate built from the model ``Meta.ordering`` plus the primary key
+as a tie-breaker, so page N costs the same as page 1 instead of scanning
+``OFFSET`` rows. Cursors are opaque base64 tokens holding the ordering values
+of the last row of the previous page.
+"""
+import base64
+import json
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+from graphql_relay import cursor_to_offset
+
+CURSOR_PREFIX = 'keyset:'
+
+
+def keyset_ordering(model):
+    """Return ``[(field_name, descending), ...]`` for ``model``'s ordering"""
+    ordering = []
+    for name in model._meta.ordering:
+        descending = name.startswith('-')
+        ordering.append((name.lstrip('-'), descending))
+    pk_name = model._meta.pk.name
+    if pk_name not in [name for name, _ in ordering]:
+        # Follow the direction of the last key so the index can be walked
+        descending = ordering[-1][1] if ordering else False
+        ordering.append((pk_name, descending))
+    return ordering
+
+
+def keyset_fields(model):
+    """Column names the cursor is built from (for ``only()``)"""
+    return [name for name, _ in keyset_ordering(model)]
+
+
+def encode_cursor(values):
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode((CURSOR_PREFIX + payload).encode()).decode()
+
+
+def decode_cursor(cursor, model):
+    """Return the ordering values stored in ``cursor``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError(cursor)
+        values = json.loads(raw[len(CURSOR_PREFIX):])
+        ordering = keyset_ordering(model)
+        if len(values) != len(ordering):
+            raise ValueError(cursor)
+        return [
+            model._meta.get_field(name).to_python(value)
+            for (name, _), value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, UnicodeError, ValidationError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def is_keyset_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode()).decode().startswith(CURSOR_PREFIX)
+    except (ValueError, UnicodeError):
+        return False
+
+
+def keyset_filter(ordering, values):
+    """Build the "rows after ``values``" predicate for ``ordering``"""
+    condition = Q()
+    for index in reversed(range(len(ordering))):
+        name, descending = ordering[index]
+        after = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[index]})
+        if index < len(ordering) - 1:
+            after |= Q(**{name: values[index]}) & condition
+        condition = after
+    return condition
+
+
+def page_size(first, field_name, max_limit=None):
+    max_limit = max_limit or graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if first is None:
+        return max_limit
+    if first < 0:
+        raise GraphQLError(f"Argument `first` on `{field_name}` cannot be negative.")
+    if first > max_limit:
+        raise GraphQLError(
+            f"Requesting {first} records on the `{field_name}` connection "
+            f"exceeds the `first` limit of {max_limit} records."
+        )
+    return first
+
+
+def page_queryset(queryset, first=None, after=None, field_name='connection', max_limit=None):
+    """Return ``(ordering, limit, rows)``: the keyset page slice of ``queryset``"""
+    model = queryset.model
+    ordering = keyset_ordering(model)
+    limit = page_size(first, field_name, max_limit)
+
+    queryset = queryset.order_by(
+        *[('-' if descending else '') + name for name, descending in ordering]
+    )
+    if after:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, model)))
+
+    # Fetch one extra row to learn whether another page exists
+    return ordering, limit, queryset[:limit + 1]
+
+
+def paginate(queryset, connection_type, first=None, after=None,
+             field_name='connection', max_limit=None):
+    """Return one keyset page of ``queryset`` as a ``connection_type``"""
+    ordering, limit, rows = page_queryset(queryset, first, after, field_name, max_limit)
+    return build_connection(connection_type, list(rows), ordering, limit, after)
+
+
+async def apaginate(queryset, connection_type, first=None, after=None,
+                    field_name='connection', max_limit=None):
+    """``paginate()`` reading the page with the async ORM"""
+    ordering, limit, rows = page_queryset(queryset, first, after, field_name, max_limit)
+    return build_connection(connection_type, [row async for row in rows], ordering, limit, after)
+
+
+def build_connection(connection_type, rows, ordering, limit, after=None):
+    has_next_page = len(rows) > limit
+    rows = rows[:limit]
+
+    edges = [
+        connection_type.Edge(
+            node=row,
+            cursor=encode_cursor([getattr(row, name) for name, _ in ordering]),
+        )
+        for row in rows
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=has_next_page,
+        ),
+    )
+    connection.iterable = rows
+    return connection
+
+
+class KeysetConnectionField(graphene.Field):
+    """Connection field taking forward keyset pagination arguments"""
+
+    def __init__(self, type_, *args, **kwargs):
+        kwargs.setdefault('first', graphene.Int())
+        kwargs.setdefault('after', graphene.String())
+        super().__init__(type_, *args, **kwargs)
+
+
+class KeysetPaginationMixin:
+    """Forward pagination (``first``/``after``) for Django connection fields.
+
+    Backward pagination (``last``/``before``), ``offset`` and offset cursors
+    issued before keyset mode existed keep the stock offset behaviour.
+    """
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        after = args.get('after')
+        offset_mode = (
+            args.get('last') is not None
+            or args.get('before') is not None
+            or args.get('offset') is not None
+            or (after and not is_keyset_cursor(after) and cursor_to_offset(after) is not None)
+        )
+        if offset_mode:
+            return super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+        return paginate(
+            iterable, connection, first=args.get('first'), after=after,
+            max_limit=max_limit,
+        )
+
+
+class KeysetFilterConnectionField(KeysetPaginationMixin, DjangoFilterConnectionField):
+    pass
@@ -0,0 +1,163 @@
+"""Persisted queries (Apollo APQ protocol) and the parsed document cache.
+
+Clients send ``extensions.persistedQuery.sha256Hash`` instead of (or along
+with) the query text. The text is registered once in the Django cache under
+its hash; later requests only send the hash. Whatever the transport, the
+parsed and statically validated AST of each document is kept in a
+process-local LRU so the hot path skips ``parse()`` and ``validate()``.
+
+With ``GRAPHQL_PERSISTED_QUERIES_ONLY`` the endpoint only accepts documents
+listed in the ``GRAPHQL_PERSISTED_QUERIES_FILE`` manifest (a JSON object
+mapping sha256 hashes to query text).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError, parse
+from graphql.validation import validate
+
+from crm.tracing import phase
+from crm.validation import get_limits, static_rules
+
+APQ_CACHE_PREFIX = 'graphql:apq:'
+DEFAULT_DOCUMENT_CACHE_SIZE = 256
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class PersistedQueryNotFound(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            'PersistedQueryNotFound',
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+
+
+class PersistedQueryNotSupported(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            'PersistedQueryNotSupported',
+            extensions={'code': 'PERSISTED_QUERY_NOT_SUPPORTED'},
+        )
+
+
+class DocumentCache:
+    """Thread-safe LRU of ``sha256 -> (document, validation errors)``"""
+
+    def __init__(self, maxsize=DEFAULT_DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, schema, query, digest=None):
+        """Return ``(document, errors)`` for ``query`` parsed and validated"""
+        digest = digest or query_hash(query)
+        max_depth = get_limits()['max_depth']
+        key = (digest, id(schema), max_depth)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        try:
+            with phase('parsing'):
+                document = parse(query)
+        except GraphQLError as error:
+            # Syntax errors are cheap to reproduce, do not cache them
+            return None, [error]
+        with phase('validation'):
+            entry = (document, validate(schema, document, static_rules(max_depth)))
+
+        with self._lock:
+            self._documents[key] = entry
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+document_cache = DocumentCache(
+    getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', DEFAULT_DOCUMENT_CACHE_SIZE)
+)
+
+_manifests = {}
+_manifest_lock = threading.Lock()
+
+
+def load_manifest():
+    """Return the allow-listed ``{hash: query}`` documents"""
+    path = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_FILE', None)
+    if not path:
+        return {}
+    if path not in _manifests:
+        with _manifest_lock:
+            with open(path, encoding='utf-8') as manifest_file:
+                documents = json.load(manifest_file)
+            _manifests[path] = {query_hash(query): query for query in documents.values()}
+    return _manifests[path]
+
+
+def get_persisted_query(extensions):
+    """Return ``(version, sha256Hash)`` from the request extensions, if any"""
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise GraphQLError('Extensions are invalid JSON.')
+    if not extensions:
+        return None
+    if not isinstance(extensions, dict):
+        raise GraphQLError('Extensions must be a JSON object.')
+    persisted = extensions.get('persistedQuery')
+    if not persisted:
+        return None
+    if not isinstance(persisted, dict):
+        raise GraphQLError('persistedQuery must be a JSON object.')
+    return persisted.get('version'), persisted.get('sha256Hash')
+
+
+def resolve_query(query, extensions):
+    """Return ``(query, sha256)`` for a request, applying the APQ protocol"""
+    allow_list_only = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False)
+    persisted = get_persisted_query(extensions)
+
+    if persisted is None:
+        if allow_list_only:
+            raise GraphQLError('Only persisted queries are allowed.')
+        return query, None
+
+    version, digest = persisted
+    if version != 1 or not digest:
+        raise PersistedQueryNotSupported()
+
+    if allow_list_only:
+        registered = load_manifest().get(digest)
+        if registered is None:
+            raise PersistedQueryNotFound()
+        return registered, digest
+
+    if query:
+        if query_hash(query) != digest:
+            raise GraphQLError('provided sha does not match query')
+        cache.set(APQ_CACHE_PREFIX + digest, query, timeout=None)
+        return query, digest
+
+    query = cache.get(APQ_CACHE_PREFIX + digest) or load_manifest().get(digest)
+    if query is None:
+        raise PersistedQueryNotFound()
+    return query, digest
@@ -0,0 +1,292 @@
+"""Opt-in Redis cache for the responses of read-only GraphQL operations.
+
+Only ``query`` operations whose root fields are all listed in
+``GRAPHQL_RESPONSE_CACHE_FIELDS`` are cached, keyed by the normalized
+document, the variables, the operation name and the user.
+
+While a response is computed, ``TagCollector`` records which rows it was
+built from: ``crm.product:42`` for every object whose fields were read and
+``crm.product`` for lists, connections and empty lookups. Each tag has a
+version counter in Redis and the entry stores the versions it saw.
+Invalidating a tag only increments its counter, so any entry that depends on
+it stops matching on the next read. ``crm/invalidation.py`` calls
+``invalidate()`` for every write.
+
+A per-key lock makes concurrent misses wait for the first request instead
+of all executing the same operation. Hits, misses and stores are counted in
+the ``<prefix>stats`` hash (see ``get_stats()``). Whenever Redis is
+unreachable the operation simply executes uncached. Turning the cache on
+requires ``GRAPHQL_RESPONSE_CACHE_URL``; a missing URL fails the system
+checks rather than falling back to a local Redis.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Model
+from graphql import ExecutionResult, get_named_type, print_ast, print_schema
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, OperationType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+DEFAULT_LOCK_TIMEOUT = 5
+DEFAULT_FIELDS = ('allProducts', 'lowStockProducts', 'product')
+KEY_PREFIX = 'crm:gqlcache:'
+LOCK_POLL_INTERVAL = 0.05
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'GRAPHQL_RESPONSE_CACHE', False)
+
+
+def check_settings(app_configs=None, **kwargs):
+    """System check: the enabled cache must name its Redis server"""
+    if is_enabled() and not getattr(settings, 'GRAPHQL_RESPONSE_CACHE_URL', None):
+        return [checks.Error(
+            "GRAPHQL_RESPONSE_CACHE is on but GRAPHQL_RESPONSE_CACHE_URL is not set.",
+            hint="Set it to the Redis URL the response cache should use.",
+            id='crm.E001',
+        )]
+    return []
+
+
+def get_redis():
+    """Redis client for the cache at ``GRAPHQL_RESPONSE_CACHE_URL``"""
+    url = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_URL', None)
+    if not url:
+        raise ImproperlyConfigured("GRAPHQL_RESPONSE_CACHE_URL must be set to use the response cache.")
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return _clients[url]
+
+
+def model_tag(model):
+    return model._meta.concrete_model._meta.label_lower
+
+
+def instance_tag(instance):
+    return f"{model_tag(type(instance))}:{instance.pk}"
+
+
+def _version_key(tag):
+    return f"{KEY_PREFIX}tag:{tag}"
+
+
+GENERATION_KEY = KEY_PREFIX + 'generation'
+STATS_KEY = KEY_PREFIX + 'stats'
+
+
+@lru_cache(maxsize=None)
+def _type_model(graphql_type):
+    """Django model behind a GraphQL object or connection type, if any"""
+    meta = getattr(getattr(graphql_type, 'graphene_type', None), '_meta', None)
+    model = getattr(meta, 'model', None)
+    node = getattr(meta, 'node', None)
+    if model is None and node is not None:
+        model = getattr(node._meta, 'model', None)
+    return model
+
+
+class TagCollector:
+    """Graphene middleware recording the rows a response depends on"""
+
+    def __init__(self):
+        self.tags = set()
+
+    def resolve(self, next, root, info, **args):
+        if isinstance(root, Model):
+            self.tags.add(instance_tag(root))
+        result = next(root, info, **args)
+        model = _type_model(get_named_type(info.return_type))
+        if model is not None:
+            if isinstance(result, Model):
+                self.tags.add(instance_tag(result))
+            else:
+                # Lists, connections and missing rows depend on the whole table
+                self.tags.add(model_tag(model))
+        return result
+
+
+def root_fields(document, operation_ast):
+    """Names of the root fields selected by ``operation_ast``"""
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    names = set()
+    pending = list(operation_ast.selection_set.selections)
+    seen = set()
+    while pending:
+        selection = pending.pop()
+        if isinstance(selection, FieldNode):
+            names.add(selection.name.value)
+        elif isinstance(selection, InlineFragmentNode):
+            pending.extend(selection.selection_set.selections)
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            if name in fragments and name not in seen:
+                seen.add(name)
+                pending.extend(fragments[name].selection_set.selections)
+    names.discard('__typename')
+    return names
+
+
+def is_cacheable(document, operation_ast):
+    if not is_enabled() or operation_ast is None:
+        return False
+    if operation_ast.operation != OperationType.QUERY:
+        return False
+    fields = root_fields(document, operation_ast)
+    allowed = set(getattr(settings, 'GRAPHQL_RESPONSE_CACHE_FIELDS', DEFAULT_FIELDS))
+    return bool(fields) and fields <= allowed
+
+
+@lru_cache(maxsize=8)
+def _schema_digest(schema):
+    return hashlib.sha256(print_schema(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(request, schema, document, operation_name, variables):
+    user = getattr(request, 'user', None)
+    user_key = user.pk if user is not None and user.is_authenticated else 'anonymous'
+    payload = json.dumps(
+        [print_ast(document), operation_name, variables or {}, str(user_key)],
+        sort_keys=True,
+        cls=DjangoJSONEncoder,
+    )
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}response:{_schema_digest(schema)}:{digest}"
+
+
+class ResponseCache:
+    def __init__(self, client=None):
+        self.redis = client or get_redis()
+        self.ttl = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_TTL', DEFAULT_TTL)
+        self.lock_timeout = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+
+    def count(self, name):
+        self.redis.hincrby(STATS_KEY, name, 1)
+
+    def get(self, key):
+        """Return the cached data for ``key`` if none of its tags changed"""
+        raw = self.redis.get(key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        tags = list(entry['tags'])
+        if tags:
+            current = self.redis.mget([_version_key(tag) for tag in tags])
+            if any(int(version or 0) != entry['tags'][tag] for tag, version in zip(tags, current)):
+                return None
+        return entry['data']
+
+    def set(self, key, data, tags, generation):
+        """Store ``data`` unless something was invalidated while it was computed"""
+        tags = sorted(tags)
+        values = self.redis.mget([GENERATION_KEY] + [_version_key(tag) for tag in tags])
+        if int(values[0] or 0) != generation:
+            return False
+        entry = {
+            'tags': {tag: int(version or 0) for tag, version in zip(tags, values[1:])},
+            'data': data,
+        }
+        self.redis.set(key, json.dumps(entry, cls=DjangoJSONEncoder), ex=self.ttl)
+        return True
+
+    def fetch(self, key, execute):
+        """Return ``(result, status)``, running ``execute(collector)`` on a miss"""
+        data = self.get(key)
+        if data is not None:
+            self.count('hits')
+            return ExecutionResult(data=data), 'HIT'
+
+        lock = self.redis.lock(key + ':lock', timeout=self.lock_timeout)
+        if not lock.acquire(blocking=False):
+            # Someone else is computing this response: wait for it
+            self.count('lock_waits')
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                data = self.get(key)
+                if data is not None:
+                    self.count('hits')
+                    return ExecutionResult(data=data), 'HIT'
+            lock = None
+
+        try:
+            self.count('misses')
+            generation = int(self.redis.get(GENERATION_KEY) or 0)
+            collector = TagCollector()
+            result = execute(collector)
+            if not result.errors and result.data is not None:
+                try:
+                    if self.set(key, result.data, collector.tags, generation):
+                        self.count('stores')
+                except redis.exceptions.RedisError as e:
+                    logger.warning("Could not store GraphQL response: %s", e)
+            return result, 'MISS'
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except redis.exceptions.RedisError:
+                    # Includes LockError: the lock expired while executing
+                    pass
+
+
+def execute_cached(request, schema, document, operation_name, variables, execute):
+    """Serve ``execute(middleware)`` from the response cache when possible.
+
+    Returns ``(result, status)`` where status is ``'HIT'``, ``'MISS'`` or
+    ``None`` when the cache could not be used.
+    """
+    try:
+        response_cache = ResponseCache()
+        key = cache_key(request, schema, document, operation_name, variables)
+        return response_cache.fetch(key, lambda collector: execute([collector]))
+    except redis.exceptions.RedisError as e:
+        logger.warning("GraphQL response cache unavailable: %s", e)
+    return execute([]), None
+
+
+def _invalidate_now(tags):
+    try:
+        client = get_redis()
+        pipeline = client.pipeline(transaction=False)
+        for tag in sorted(tags):
+            pipeline.incr(_version_key(tag))
+        pipeline.incr(GENERATION_KEY)
+        pipeline.hincrby(STATS_KEY, 'invalidations', len(tags))
+        pipeline.execute()
+    except redis.exceptions.RedisError as e:
+        logger.warning("Could not invalidate GraphQL response cache tags %s: %s", tags, e)
+
+
+def invalidate(model, pks=None):
+    """Invalidate cached responses built from ``model`` (and rows ``pks``)"""
+    if not is_enabled():
+        return
+    tags = {model_tag(model)}
+    tags.update(f"{model_tag(model)}:{pk}" for pk in pks or ())
+    transaction.on_commit(lambda: _invalidate_now(tags))
+
+
+def get_stats():
+    """Return the hit/miss counters, e.g. ``{'hits': 10, 'misses': 2, ...}``"""
+    stats = get_redis().hgetall(STATS_KEY)
+    return {name.decode(): int(value) for name, value in stats.items()}
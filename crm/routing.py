@@ -0,0 +1,219 @@
+"""Read-replica routing for GraphQL queries.
+
+Every database alias in ``CRM_DB_REPLICAS`` is a read replica of
+``default``. ``ReplicaRouter`` sends all writes to ``default``; reads only go
+to a replica inside ``use_replicas()``, which ``CRMGraphQLView`` enters for
+``query`` operations and the read-only reporting tasks use. Everything else
+(mutations, the admin, management commands) keeps reading the primary.
+
+One replica is chosen per operation, round-robin over the replicas whose lag
+is below ``CRM_DB_REPLICA_MAX_LAG`` seconds. Lag is measured at most every
+``CRM_DB_REPLICA_CHECK_INTERVAL`` seconds per replica; a replica that is
+behind or unreachable is skipped, and reads fall back to the primary when no
+replica qualifies.
+
+After a request writes, ``ReplicaRoutingMiddleware`` sets a cookie that pins
+the client to the primary for ``CRM_DB_PIN_SECONDS``, so it reads its own
+writes even while the replicas catch up. Code that must read the primary
+inside ``use_replicas()`` wraps those reads in ``use_primary()``.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE = 'crm_primary'
+DEFAULT_MAX_LAG = 5
+DEFAULT_CHECK_INTERVAL = 10
+DEFAULT_PIN_SECONDS = 10
+
+_round_robin = itertools.count()
+_lag_checks = {}
+_lag_checks_lock = threading.Lock()
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        # Pinned to the primary after a recent write by the same client
+        self.pinned = pinned
+        self.use_replicas = False
+        self.replica = None
+        self.wrote = False
+
+
+_state = ContextVar('crm_routing_state', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'CRM_DB_REPLICAS', []))
+
+
+def replica_lag(alias):
+    """Replication lag of ``alias`` in seconds (0 for SQLite stand-ins)"""
+    with connections[alias].cursor() as cursor:
+        if connections[alias].vendor == 'postgresql':
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            return float(cursor.fetchone()[0])
+        cursor.execute("SELECT 1")
+        return 0.0
+
+
+def is_replica_available(alias):
+    """Whether ``alias`` is reachable and not too far behind (cached)"""
+    interval = getattr(settings, 'CRM_DB_REPLICA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    now = time.monotonic()
+    with _lag_checks_lock:
+        checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < interval:
+        return checked[1]
+    try:
+        available = replica_lag(alias) <= getattr(settings, 'CRM_DB_REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+    except DatabaseError:
+        connections[alias].close()
+        available = False
+    with _lag_checks_lock:
+        _lag_checks[alias] = (now, available)
+    return available
+
+
+def choose_replica():
+    """Next available replica in round-robin order, or None"""
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    start = next(_round_robin)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if is_replica_available(alias):
+            return alias
+    return None
+
+
+@contextmanager
+def routing_state(pinned=False):
+    token = _state.set(RoutingState(pinned=pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_replicas():
+    """Let the reads in this block go to one read replica"""
+    state = _state.get()
+    if state is None:
+        with routing_state() as state, use_replicas():
+            yield
+        return
+    previous = state.use_replicas, state.replica
+    state.use_replicas, state.replica = True, None
+    try:
+        yield
+    finally:
+        state.use_replicas, state.replica = previous
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary in this block, even inside ``use_replicas()``"""
+    state = _state.get()
+    if state is None:
+        with routing_state(pinned=True):
+            yield
+        return
+    previous = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        # A write in the block keeps the rest of the request on the primary
+        state.pinned = previous or state.wrote
+
+
+def mark_write():
+    state = _state.get()
+    if state is not None:
+        state.wrote = True
+        # Later reads in this request must see the write
+        state.pinned = True
+
+
+class ReplicaRouter:
+    """Writes go to the primary, reads in ``use_replicas()`` to a replica"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replicas or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks writes per request and pins clients that wrote to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_state(pinned=self.is_pinned(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        with routing_state(pinned=self.is_pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(state, response)
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def process_response(state, response):
+        if state.wrote:
+            seconds = getattr(settings, 'CRM_DB_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + seconds)),
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
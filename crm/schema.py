@@ -1,27 +1,44 @@
 import graphene
+from asgiref.sync import sync_to_async
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from graphene import relay
 from crm.models import Order, Product, Customer
+from crm import analytics, entity_cache
 from crm.filters import CustomerFilter
+from crm.invalidation import invalidate
+from crm.inventory import (
+    LOW_STOCK_THRESHOLD, RESTOCK_AMOUNT, InsufficientStock, reserve_stock, restock_low_stock,
+)
+from crm.loaders import get_loaders
+from crm.optimizer import optimize, prefetch_selected
+from crm.pagination import (
+    KeysetConnectionField, KeysetFilterConnectionField, apaginate, keyset_fields, paginate,
+)
+from crm.search import DEFAULT_SEARCH_LIMIT, rank_customers
+from crm.summary import record_customers, record_orders
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.utils import timezone
 import re
 from decimal import Decimal
 import uuid
 
+DEFAULT_BULK_CREATE_BATCH_SIZE = 500
+
 
 class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
-        fields = '__all__'
+        exclude = ['search_text']
 
 
 class CustomerNode(DjangoObjectType):
     class Meta:
         model = Customer
-        filter_fields = ['name', 'email']
+        exclude = ['search_text']
+        filterset_class = CustomerFilter
         interfaces = (relay.Node,)
 
 
@@ -30,6 +47,18 @@ class OrderType(DjangoObjectType):
         model = Order
         fields = '__all__'
 
+    def resolve_customer(self, info):
+        # Joined by the optimizer when the orders came from a shaped queryset
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customers.load(self.customer_id)
+
+    def resolve_products(self, info):
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'products' in prefetched:
+            return list(prefetched['products'])
+        return get_loaders(info).order_products.load(self.pk)
+
 
 class ProductType(DjangoObjectType):
     class Meta:
@@ -37,6 +66,35 @@ class ProductType(DjangoObjectType):
         fields = '__all__'
 
 
+class OrderConnection(relay.Connection):
+    class Meta:
+        node = OrderType
+
+
+class ProductConnection(relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class SalesGroupBy(graphene.Enum):
+    DAY = analytics.DAY
+    WEEK = analytics.WEEK
+    MONTH = analytics.MONTH
+
+
+class SalesBucketType(graphene.ObjectType):
+    period_start = graphene.DateTime()
+    period_end = graphene.DateTime()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class TopCustomerType(graphene.ObjectType):
+    customer = graphene.Field(CustomerType)
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
 # Input Types
 class CustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -64,46 +122,139 @@ class ErrorType(graphene.ObjectType):
 
 class Query(graphene.ObjectType):
     hello = graphene.String()
-    all_customers = DjangoFilterConnectionField(CustomerNode, filterset_class=CustomerFilter)
-    all_orders = graphene.List(OrderType)
-    all_products = graphene.List(ProductType)
+    all_customers = KeysetFilterConnectionField(CustomerNode, filterset_class=CustomerFilter)
+    all_orders = KeysetConnectionField(
+        OrderConnection,
+        created_after=graphene.DateTime(),
+        status=graphene.String(),
+    )
+    all_products = KeysetConnectionField(ProductConnection)
     customer = graphene.Field(CustomerType, id=graphene.Int())
     order = graphene.Field(OrderType, id=graphene.Int())
     product = graphene.Field(ProductType, id=graphene.Int())
     low_stock_products = graphene.List(ProductType)
+    sales_stats = graphene.List(
+        SalesBucketType,
+        group_by=SalesGroupBy(default_value=SalesGroupBy.DAY),
+        from_=graphene.DateTime(name='from'),
+        to=graphene.DateTime(),
+        status=graphene.String(),
+        description="Orders and revenue per bucket in [from, to) (default: the last 30 buckets)",
+    )
+    top_customers = graphene.List(
+        TopCustomerType,
+        limit=graphene.Int(default_value=analytics.DEFAULT_TOP_CUSTOMERS),
+        from_=graphene.DateTime(name='from'),
+        to=graphene.DateTime(),
+        description="Customers with the highest revenue in [from, to)",
+    )
+    search_customers = graphene.List(
+        CustomerType,
+        query=graphene.String(required=True),
+        limit=graphene.Int(default_value=DEFAULT_SEARCH_LIMIT),
+        description="Customers matching every term of query by name, email or phone, best first",
+    )
 
     def resolve_hello(self, info):
         return "Hello, GraphQL!"
 
-    def resolve_all_customers(self, info):
-        return Customer.objects.all()
+    def resolve_all_customers(self, info, **kwargs):
+        return optimize(Customer.objects.all(), info, extra_fields=keyset_fields(Customer))
 
-    def resolve_all_orders(self, info):
-        return Order.objects.all()
+    def resolve_all_orders(self, info, first=None, after=None, created_after=None, status=None):
+        queryset = filter_orders(info, created_after, status)
+        connection = paginate(queryset, OrderConnection, first=first, after=after,
+                              field_name=info.field_name)
+        get_loaders(info).queue_orders(connection.iterable)
+        return connection
 
     def resolve_customer(self, info, id):
-        try:
-            return Customer.objects.get(pk=id)
-        except Customer.DoesNotExist:
-            return None
+        loaders = get_loaders(info)
+        return prefetch_selected(loaders.lookup(loaders.customers, info, id), info)
 
     def resolve_order(self, info, id):
-        try:
-            return Order.objects.get(pk=id)
-        except Order.DoesNotExist:
+        loaders = get_loaders(info)
+        order = loaders.lookup(loaders.orders, info, id)
+        if order is None:
             return None
+        loaders.queue_orders([order])
+        return order
 
-    def resolve_all_products(self, info):
-        return Product.objects.all()
+    def resolve_all_products(self, info, first=None, after=None):
+        queryset = optimize(Product.objects.all(), info, extra_fields=keyset_fields(Product))
+        return paginate(queryset, ProductConnection, first=first, after=after,
+                        field_name=info.field_name)
 
     def resolve_product(self, info, id):
-        try:
-            return Product.objects.get(pk=id)
-        except Product.DoesNotExist:
-            return None
+        loaders = get_loaders(info)
+        return prefetch_selected(loaders.lookup(loaders.products, info, id), info)
 
     def resolve_low_stock_products(self, info):
-        return Product.objects.filter(stock__lt=10)
+        return optimize(Product.objects.filter(stock__lt=10), info)
+
+    def resolve_sales_stats(self, info, group_by=SalesGroupBy.DAY, from_=None, to=None, status=None):
+        return analytics.sales_stats(group_by.value, start=from_, end=to, status=status)
+
+    def resolve_top_customers(self, info, limit=analytics.DEFAULT_TOP_CUSTOMERS, from_=None, to=None):
+        return analytics.top_customers(limit, start=from_, end=to)
+
+    def resolve_search_customers(self, info, query, limit=DEFAULT_SEARCH_LIMIT):
+        return rank_customers(optimize(Customer.objects.all(), info), query, limit)
+
+    # Async ORM versions of the resolvers above, used by the ASGI view for
+    # the first root field of a query (crm/async_execution.py). The other
+    # root fields run their regular resolver on a thread of their own.
+
+    async def aresolve_all_orders(self, info, first=None, after=None, created_after=None, status=None):
+        queryset = filter_orders(info, created_after, status)
+        connection = await apaginate(queryset, OrderConnection, first=first, after=after,
+                                     field_name=info.field_name)
+        get_loaders(info).queue_orders(connection.iterable)
+        return connection
+
+    async def aresolve_all_products(self, info, first=None, after=None):
+        queryset = optimize(Product.objects.all(), info, extra_fields=keyset_fields(Product))
+        return await apaginate(queryset, ProductConnection, first=first, after=after,
+                               field_name=info.field_name)
+
+    async def aresolve_low_stock_products(self, info):
+        return [product async for product in optimize(Product.objects.filter(stock__lt=10), info)]
+
+    async def aresolve_customer(self, info, id):
+        return await alookup(Customer, info, id, Query.resolve_customer)
+
+    async def aresolve_product(self, info, id):
+        return await alookup(Product, info, id, Query.resolve_product)
+
+    async def aresolve_order(self, info, id):
+        order = await alookup(Order, info, id, Query.resolve_order)
+        if order is not None:
+            get_loaders(info).queue_orders([order])
+        return order
+
+
+def filter_orders(info, created_after=None, status=None):
+    """The ``allOrders`` queryset for the current selection"""
+    queryset = Order.objects.all()
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if status:
+        queryset = queryset.filter(status=status.lower())
+    return optimize(queryset, info, extra_fields=keyset_fields(Order))
+
+
+async def alookup(model, info, id, resolve):
+    """Root ``field(id: ...)`` lookup with ``aget()``.
+
+    With the shared entity cache on, the synchronous ``resolve`` (batched
+    through the loaders and served from the cache) is used instead.
+    """
+    if entity_cache.is_enabled():
+        return await sync_to_async(resolve)(None, info, id)
+    try:
+        return await optimize(model.objects.all(), info).aget(pk=id)
+    except model.DoesNotExist:
+        return None
 
 
 # Utility functions for validation
@@ -115,6 +266,28 @@ def validate_phone_format(phone):
     return bool(re.match(pattern, phone))
 
 
+def count_product_ids(product_ids):
+    """Return ``({product_id: quantity}, [unparseable ids])`` in input order"""
+    quantities = {}
+    invalid_ids = []
+    for product_id in product_ids:
+        try:
+            pk = int(product_id)
+        except (TypeError, ValueError):
+            invalid_ids.append(product_id)
+            continue
+        quantities[pk] = quantities.get(pk, 0) + 1
+    return quantities, invalid_ids
+
+
+def split_name(name):
+    """Split a full name into first_name and last_name"""
+    name_parts = name.strip().split(' ', 1)
+    first_name = name_parts[0]
+    last_name = name_parts[1] if len(name_parts) > 1 else ''
+    return first_name, last_name
+
+
 class CreateCustomer(graphene.Mutation):
     class Arguments:
         input = CustomerInput(required=True)
@@ -144,17 +317,16 @@ class CreateCustomer(graphene.Mutation):
             return CreateCustomer(customer=None, message="Validation failed", errors=errors)
         
         # Split name into first_name and last_name
-        name_parts = input.name.strip().split(' ', 1)
-        first_name = name_parts[0]
-        last_name = name_parts[1] if len(name_parts) > 1 else ''
+        first_name, last_name = split_name(input.name)
         
         try:
-            customer = Customer.objects.create(
-                first_name=first_name,
-                last_name=last_name,
-                email=input.email,
-                phone=input.phone or ''
-            )
+            with transaction.atomic():
+                customer = Customer.objects.create(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=input.email,
+                    phone=input.phone or ''
+                )
             return CreateCustomer(
                 customer=customer,
                 message="Customer created successfully",
@@ -179,47 +351,85 @@ class BulkCreateCustomers(graphene.Mutation):
     def mutate(self, info, input):
         created_customers = []
         errors = []
-        
+        batch_size = getattr(settings, 'CRM_BULK_CREATE_BATCH_SIZE', DEFAULT_BULK_CREATE_BATCH_SIZE)
+
+        # Validate formats in memory first
+        valid_emails = []
+        format_errors = {}
+        for i, customer_data in enumerate(input):
+            try:
+                validate_email(customer_data.email)
+                valid_emails.append(customer_data.email)
+            except ValidationError:
+                format_errors[i] = f"Customer {i+1}: Invalid email format"
+
+        # Check uniqueness of the whole batch with one query per chunk
+        taken_emails = set()
+        for start in range(0, len(valid_emails), batch_size):
+            chunk = valid_emails[start:start + batch_size]
+            taken_emails.update(
+                Customer.objects.filter(email__in=chunk).values_list('email', flat=True)
+            )
+
+        rows = []
+        for i, customer_data in enumerate(input):
+            if i in format_errors:
+                errors.append((i, format_errors[i]))
+                continue
+
+            # Duplicates inside the batch count as existing emails too
+            if customer_data.email in taken_emails:
+                errors.append((i, f"Customer {i+1}: Email already exists"))
+                continue
+
+            if customer_data.phone and not validate_phone_format(customer_data.phone):
+                errors.append((i, f"Customer {i+1}: Invalid phone format"))
+                continue
+
+            first_name, last_name = split_name(customer_data.name)
+            taken_emails.add(customer_data.email)
+            customer = Customer(
+                first_name=first_name,
+                last_name=last_name,
+                email=customer_data.email,
+                phone=customer_data.phone or ''
+            )
+            # bulk_create() does not call save()
+            customer.update_search_text()
+            rows.append((i, customer))
+
         with transaction.atomic():
-            for i, customer_data in enumerate(input):
+            for start in range(0, len(rows), batch_size):
+                chunk = rows[start:start + batch_size]
                 try:
-                    # Validate email format
-                    try:
-                        validate_email(customer_data.email)
-                    except ValidationError:
-                        errors.append(f"Customer {i+1}: Invalid email format")
-                        continue
-                    
-                    # Check email uniqueness
-                    if Customer.objects.filter(email=customer_data.email).exists():
-                        errors.append(f"Customer {i+1}: Email already exists")
-                        continue
-                    
-                    # Validate phone format
-                    if customer_data.phone and not validate_phone_format(customer_data.phone):
-                        errors.append(f"Customer {i+1}: Invalid phone format")
-                        continue
-                    
-                    # Split name into first_name and last_name
-                    name_parts = customer_data.name.strip().split(' ', 1)
-                    first_name = name_parts[0]
-                    last_name = name_parts[1] if len(name_parts) > 1 else ''
-                    
-                    customer = Customer.objects.create(
-                        first_name=first_name,
-                        last_name=last_name,
-                        email=customer_data.email,
-                        phone=customer_data.phone or ''
-                    )
-                    created_customers.append(customer)
-                    
-                except Exception as e:
-                    errors.append(f"Customer {i+1}: {str(e)}")
-        
+                    with transaction.atomic():
+                        created_customers.extend(
+                            Customer.objects.bulk_create([customer for _, customer in chunk])
+                        )
+                except Exception:
+                    # A concurrent insert broke the chunk: retry row by row
+                    # so only the offending customers are reported.
+                    for i, customer in chunk:
+                        try:
+                            with transaction.atomic():
+                                customer.save(force_insert=True)
+                            created_customers.append(customer)
+                        except Exception as e:
+                            customer.pk = None
+                            errors.append((i, f"Customer {i+1}: {str(e)}"))
+
+            # One counter update for the whole batch
+            record_customers(len(created_customers))
+            # bulk_create sends no post_save signals
+            invalidate(Customer, [customer.pk for customer in created_customers])
+
+        # Report errors in input order whichever stage raised them
+        errors = [error for _, error in sorted(errors, key=lambda item: item[0])]
+
         success_count = len(created_customers)
         error_count = len(errors)
         message = f"Successfully created {success_count} customers. {error_count} failed."
-        
+
         return BulkCreateCustomers(
             customers=created_customers,
             errors=errors,
@@ -283,7 +493,7 @@ class CreateOrder(graphene.Mutation):
         # Validate customer exists
         try:
             customer = Customer.objects.get(pk=input.customer_id)
-        except Customer.DoesNotExist:
+        except (Customer.DoesNotExist, ValueError):
             errors.append(ErrorType(field="customer_id", message="Invalid customer ID"))
             return CreateOrder(order=None, message="Validation failed", errors=errors)
         
@@ -292,22 +502,32 @@ class CreateOrder(graphene.Mutation):
             errors.append(ErrorType(field="product_ids", message="At least one product must be selected"))
             return CreateOrder(order=None, message="Validation failed", errors=errors)
         
-        products = []
-        total_amount = Decimal('0.00')
-        
-        for product_id in input.product_ids:
-            try:
-                product = Product.objects.get(pk=product_id)
-                products.append(product)
-                total_amount += product.price
-            except Product.DoesNotExist:
-                errors.append(ErrorType(field="product_ids", message=f"Invalid product ID: {product_id}"))
+        # A product id listed several times orders that many units of it
+        quantities, invalid_ids = count_product_ids(input.product_ids)
+        products = Product.objects.in_bulk(list(quantities))
+        missing_ids = invalid_ids + [pk for pk in quantities if pk not in products]
+        for product_id in missing_ids:
+            errors.append(ErrorType(field="product_ids", message=f"Invalid product ID: {product_id}"))
         
         if errors:
             return CreateOrder(order=None, message="Validation failed", errors=errors)
         
+        total_amount = sum(
+            (products[pk].price * quantity for pk, quantity in quantities.items()),
+            Decimal('0.00')
+        )
+        
         try:
             with transaction.atomic():
+                # Reserve stock for the whole cart in one conditional UPDATE
+                short_ids = reserve_stock(quantities)
+                if short_ids:
+                    errors = [
+                        ErrorType(field="product_ids", message=f"Insufficient stock for product ID: {pk}")
+                        for pk in short_ids
+                    ]
+                    return CreateOrder(order=None, message="Validation failed", errors=errors)
+                
                 # Generate unique order number
                 order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
                 
@@ -315,11 +535,13 @@ class CreateOrder(graphene.Mutation):
                     customer=customer,
                     order_number=order_number,
                     total_amount=total_amount,
-                    created_at=input.order_date if input.order_date else None
+                    created_at=input.order_date or timezone.now()
                 )
                 
                 # Add products to the order
-                order.products.set(products)
+                Order.products.through.objects.bulk_create([
+                    Order.products.through(order=order, product_id=pk) for pk in quantities
+                ])
                 
             return CreateOrder(
                 order=order,
@@ -334,29 +556,173 @@ class CreateOrder(graphene.Mutation):
             )
 
 
+def generate_order_numbers(count):
+    """Return ``count`` order numbers unused in the batch and in the database"""
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {f"ORD-{uuid.uuid4().hex[:8].upper()}" for _ in range(count - len(numbers))}
+        candidates -= numbers
+        taken = Order.objects.filter(order_number__in=candidates).values_list('order_number', flat=True)
+        numbers |= candidates - set(taken)
+    return list(numbers)
+
+
+def create_order_chunk(rows):
+    """Insert ``(index, order, quantities)`` rows in one transaction"""
+    with transaction.atomic():
+        cart = {}
+        for _, _, quantities in rows:
+            for pk, quantity in quantities.items():
+                cart[pk] = cart.get(pk, 0) + quantity
+        short_ids = reserve_stock(cart)
+        if short_ids:
+            raise InsufficientStock(short_ids)
+
+        for (_, order, _), order_number in zip(rows, generate_order_numbers(len(rows))):
+            order.order_number = order_number
+        orders = Order.objects.bulk_create([order for _, order, _ in rows])
+        if any(order.pk is None for order in orders):
+            # Backends that cannot return ids from a bulk INSERT
+            ids = dict(
+                Order.objects.filter(order_number__in=[order.order_number for order in orders])
+                .values_list('order_number', 'pk')
+            )
+            for order in orders:
+                order.pk = ids[order.order_number]
+
+        Order.products.through.objects.bulk_create([
+            Order.products.through(order_id=order.pk, product_id=pk)
+            for _, order, quantities in rows
+            for pk in quantities
+        ])
+        record_orders(orders)
+        invalidate(Order, [order.pk for order in orders])
+    return orders
+
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+        chunk_size = graphene.Int()
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+    message = graphene.String()
+
+    def mutate(self, info, input, chunk_size=None):
+        created_orders = []
+        errors = []
+        batch_size = chunk_size or getattr(settings, 'CRM_BULK_CREATE_BATCH_SIZE', DEFAULT_BULK_CREATE_BATCH_SIZE)
+        if batch_size <= 0:
+            return BulkCreateOrders(orders=[], errors=["chunkSize must be positive"], message="Validation failed")
+
+        # Parse the batch and collect every referenced id
+        parsed = []
+        customer_ids = set()
+        product_ids = set()
+        for order_data in input:
+            try:
+                customer_id = int(order_data.customer_id)
+                customer_ids.add(customer_id)
+            except (TypeError, ValueError):
+                customer_id = None
+            quantities, invalid_ids = count_product_ids(order_data.product_ids or [])
+            product_ids.update(quantities)
+            parsed.append((customer_id, quantities, invalid_ids))
+
+        # Validate customers and products with one query per chunk
+        customer_ids = list(customer_ids)
+        product_ids = list(product_ids)
+        existing_customers = set()
+        for start in range(0, len(customer_ids), batch_size):
+            chunk = customer_ids[start:start + batch_size]
+            existing_customers.update(
+                Customer.objects.filter(pk__in=chunk).values_list('pk', flat=True)
+            )
+        products = {}
+        for start in range(0, len(product_ids), batch_size):
+            products.update(Product.objects.in_bulk(product_ids[start:start + batch_size]))
+
+        now = timezone.now()
+        rows = []
+        for i, (order_data, (customer_id, quantities, invalid_ids)) in enumerate(zip(input, parsed)):
+            if customer_id not in existing_customers:
+                errors.append((i, f"Order {i+1}: Invalid customer ID"))
+                continue
+
+            if not quantities and not invalid_ids:
+                errors.append((i, f"Order {i+1}: At least one product must be selected"))
+                continue
+
+            missing_ids = invalid_ids + [pk for pk in quantities if pk not in products]
+            if missing_ids:
+                errors.append((i, f"Order {i+1}: Invalid product ID: {', '.join(map(str, missing_ids))}"))
+                continue
+
+            total_amount = sum(
+                (products[pk].price * quantity for pk, quantity in quantities.items()),
+                Decimal('0.00')
+            )
+            rows.append((i, Order(
+                customer_id=customer_id,
+                total_amount=total_amount,
+                created_at=order_data.order_date or now
+            ), quantities))
+
+        # Each chunk commits on its own so one bad row cannot undo the rest
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            try:
+                created_orders.extend(create_order_chunk(chunk))
+            except Exception:
+                # Retry row by row so only the offending orders are reported
+                for i, order, quantities in chunk:
+                    order.pk = None
+                    order._state.adding = True
+                    try:
+                        created_orders.extend(create_order_chunk([(i, order, quantities)]))
+                    except Exception as e:
+                        errors.append((i, f"Order {i+1}: {str(e)}"))
+
+        # Report errors in input order whichever stage raised them
+        errors = [error for _, error in sorted(errors, key=lambda item: item[0])]
+
+        success_count = len(created_orders)
+        error_count = len(errors)
+        message = f"Successfully created {success_count} orders. {error_count} failed."
+
+        return BulkCreateOrders(
+            orders=get_loaders(info).queue_orders(created_orders),
+            errors=errors,
+            message=message
+        )
+
+
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(default_value=LOW_STOCK_THRESHOLD)
+        amount = graphene.Int(default_value=RESTOCK_AMOUNT)
 
     updated_products = graphene.List(ProductType)
     success = graphene.Boolean()
     message = graphene.String()
     count = graphene.Int()
 
-    def mutate(self, info):
-        # Query products with stock < 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
-        
-        # Update each product by incrementing stock by 10
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
-        
+    def mutate(self, info, threshold=LOW_STOCK_THRESHOLD, amount=RESTOCK_AMOUNT):
+        if amount <= 0:
+            return UpdateLowStockProducts(
+                updated_products=[],
+                success=False,
+                message="Restock amount must be positive",
+                count=0
+            )
+
+        # Increment stock of products below the threshold in one UPDATE
+        updated_products = restock_low_stock(threshold=threshold, amount=amount)
+
         count = len(updated_products)
         message = f"Successfully updated {count} low-stock products"
-        
+
         return UpdateLowStockProducts(
             updated_products=updated_products,
             success=True,
@@ -370,6 +736,7 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
 
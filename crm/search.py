@@ -0,0 +1,248 @@
+"""Customer search on an indexed, normalized ``search_text`` column.
+
+``Customer.save()`` (and the bulk create path) store the name, email and
+phone lowercased, without accents and with collapsed whitespace.
+``Customer.objects.update()`` and ``bulk_update()`` refresh it when they
+change one of those columns; raw SQL writes must call
+``Customer.objects.filter(...).refresh_search_text()`` themselves.
+
+Searching splits the query the same way and requires every term to match:
+
+* terms of three characters or more match anywhere (trigram matching),
+  through the ``crm_customer_fts`` FTS5 table on SQLite and a ``pg_trgm``
+  GIN index on PostgreSQL;
+* shorter terms match the start of any word (a last name such as "li").
+  Next to a longer term they only filter the rows it found; a query made
+  only of short terms scans ``search_text``.
+
+On SQLite the FTS5 table uses ``crm_customer`` as external content and is
+kept in sync by triggers. Django rebuilds the table (dropping its triggers)
+for some schema changes, so ``install_search_index()`` also runs after every
+``migrate`` and rebuilds the index when a trigger is missing.
+"""
+import logging
+import unicodedata
+
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from graphql import GraphQLError
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'crm_customer_fts'
+TRIGGERS = {
+    'crm_customer_fts_insert': (
+        "AFTER INSERT ON crm_customer BEGIN "
+        "INSERT INTO crm_customer_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+    ),
+    'crm_customer_fts_delete': (
+        "AFTER DELETE ON crm_customer BEGIN "
+        "INSERT INTO crm_customer_fts(crm_customer_fts, rowid, search_text) "
+        "VALUES ('delete', old.id, old.search_text); END"
+    ),
+    'crm_customer_fts_update': (
+        "AFTER UPDATE OF search_text ON crm_customer BEGIN "
+        "INSERT INTO crm_customer_fts(crm_customer_fts, rowid, search_text) "
+        "VALUES ('delete', old.id, old.search_text); "
+        "INSERT INTO crm_customer_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+    ),
+}
+TRIGRAM_INDEX = 'crm_customer_search_trgm'
+MIN_TRIGRAM_LENGTH = 3
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Databases (by NAME) known to have the FTS5 table
+_fts_databases = {}
+
+
+def normalize(text):
+    """Lowercase ``text``, strip accents and collapse whitespace"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+# Customer columns that make up search_text
+SEARCH_TEXT_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def customer_search_text(customer):
+    return normalize(' '.join(getattr(customer, field) for field in SEARCH_TEXT_FIELDS))
+
+
+def terms(query):
+    return normalize(query).split()
+
+
+def has_fts(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_databases:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            _fts_databases[name] = cursor.fetchone() is not None
+    return _fts_databases[name]
+
+
+def _fts_query(words):
+    # Quoted strings are matched as substrings by the trigram tokenizer
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+def _prefix(text):
+    return Q(search_text__gte=text, search_text__lt=text + '\U0010ffff')
+
+
+def search_customers(queryset, query):
+    """Customers of ``queryset`` matching every term of ``query``"""
+    words = terms(query)
+    if not words:
+        return queryset
+    long_words = [word for word in words if len(word) >= MIN_TRIGRAM_LENGTH]
+    short_words = [word for word in words if len(word) < MIN_TRIGRAM_LENGTH]
+    if not long_words:
+        return _match_short_words(queryset, short_words)
+
+    if has_fts(connections[queryset.db]):
+        queryset = queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_query(long_words)]
+        ))
+    else:
+        for word in long_words:
+            queryset = queryset.filter(search_text__contains=word)
+    return _match_short_words(queryset, short_words)
+
+
+def _match_short_words(queryset, short_words):
+    for word in short_words:
+        # Only checked on the rows the longer terms already selected
+        queryset = queryset.filter(_prefix(word) | Q(search_text__contains=' ' + word))
+    return queryset
+
+
+def rank_customers(queryset, query, limit=DEFAULT_SEARCH_LIMIT):
+    """The ``limit`` best matches for ``query``, best first.
+
+    Names starting with the query come first, then the best scoring rows:
+    BM25 on SQLite, trigram similarity on PostgreSQL and the shortest text
+    elsewhere.
+    """
+    if limit <= 0 or limit > MAX_SEARCH_LIMIT:
+        raise GraphQLError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}.")
+    words = terms(query)
+    if not words:
+        return list(queryset.order_by('-created_at', '-id')[:limit])
+
+    normalized = ' '.join(words)
+    connection = connections[queryset.db]
+    long_words = [word for word in words if len(word) >= MIN_TRIGRAM_LENGTH]
+    if long_words and has_fts(connection):
+        short_words = [word for word in words if len(word) < MIN_TRIGRAM_LENGTH]
+        return _rank_fts(_match_short_words(queryset, short_words), normalized, long_words, limit)
+
+    queryset = search_customers(queryset, query).annotate(prefix_match=Case(
+        When(_prefix(normalized), then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    ))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        score = TrigramSimilarity('search_text', normalized)
+        ordering = [F('score').desc()]
+    else:
+        score = Length('search_text')
+        ordering = [F('score').asc()]
+    return list(
+        queryset.annotate(score=score)
+        .order_by('prefix_match', *ordering, 'pk')[:limit]
+    )
+
+
+def _rank_fts(queryset, normalized, long_words, limit):
+    # Ranked inside one FTS5 query. The MATCH is materialized first: a
+    # per-row rank subquery, or a rowid constraint next to the MATCH, would
+    # make SQLite evaluate it once per candidate row.
+    sql = (
+        f"WITH matches AS MATERIALIZED ("
+        f"SELECT rowid AS id, rank, search_text FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+        f"SELECT id FROM matches"
+    )
+    params = [_fts_query(long_words)]
+    if queryset.query.where:
+        candidates, candidate_params = (
+            queryset.filter(pk__in=RawSQL("SELECT id FROM matches", []))
+            .order_by().values('pk').query.sql_with_params()
+        )
+        sql += f" WHERE id IN ({candidates})"
+        params.extend(candidate_params)
+    sql += " ORDER BY (search_text >= %s AND search_text < %s) DESC, rank, id LIMIT %s"
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, [*params, normalized, normalized + '\U0010ffff', limit])
+        ids = [row[0] for row in cursor.fetchall()]
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def install_search_index(connection, rebuild=False):
+    """Create the database-specific search index if missing (idempotent)"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+                "ON crm_customer USING gin (search_text gin_trgm_ops)"
+            )
+        return
+    if connection.vendor != 'sqlite':
+        return
+
+    _fts_databases.pop(connection.settings_dict['NAME'], None)
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "search_text, content='crm_customer', content_rowid='id', tokenize='trigram')"
+            )
+        except DatabaseError as e:
+            # SQLite older than 3.34 has no trigram tokenizer: plain LIKE scans
+            logger.warning("Customer search runs without FTS5: %s", e)
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'crm_customer'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, body in TRIGGERS.items():
+            if name not in existing:
+                cursor.execute(f"CREATE TRIGGER {name} {body}")
+                rebuild = True
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
+        elif connection.vendor == 'sqlite':
+            for name in TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_databases.pop(connection.settings_dict['NAME'], None)
+
+
+def install_after_migrate(using, **kwargs):
+    """``post_migrate`` receiver: restore triggers dropped by table rebuilds"""
+    connection = connections[using]
+    if 'crm_customer' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        description = connection.introspection.get_table_description(cursor, 'crm_customer')
+    if 'search_text' in [column.name for column in description]:
+        install_search_index(connection)
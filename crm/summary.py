@@ -0,0 +1,217 @@
+"""Incrementally maintained CRM totals.
+
+Reports read a handful of ``CRMSummary`` rows instead of counting and
+summing ``crm_order``. The ``post_save`` / ``post_delete`` receivers below
+keep them up to date for every save and delete through the ORM (mutations,
+admin, scripts), including changes to an order's status, amount or date.
+Writes that send no signals call ``record_customers()`` / ``record_orders()``
+/ ``apply_deltas()`` themselves, in the same transaction as their rows
+(``bulk_create``, the raw deletes of ``cleanup_inactive_customers``).
+``QuerySet.update()`` and raw SQL are not tracked: ``reconcile()``, run
+daily by the ``reconcile_crm_summary`` task, recomputes everything from the
+source tables and repairs any drift.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from crm.analytics import invalidate_sales_stats
+from crm.models import CRMSummary, Customer, Order
+
+CUSTOMERS = 'customers'
+ORDERS = 'orders'
+ZERO = Decimal('0.00')
+
+
+def _deltas():
+    return defaultdict(lambda: [0, ZERO])
+
+
+def _order_day(created_at):
+    if timezone.is_aware(created_at):
+        return timezone.localdate(created_at)
+    return created_at.date()
+
+
+def order_deltas(orders, sign=1):
+    """``{(kind, key): [count, revenue]}`` contributed by in-memory ``orders``"""
+    deltas = _deltas()
+    for order in orders:
+        amount = sign * order.total_amount
+        for key in (
+            (CRMSummary.TOTAL, ORDERS),
+            (CRMSummary.STATUS, order.status),
+            (CRMSummary.DAY, _order_day(order.created_at).isoformat()),
+        ):
+            deltas[key][0] += sign
+            deltas[key][1] += amount
+    return deltas
+
+
+def queryset_order_deltas(queryset, sign=1):
+    """Same as ``order_deltas()`` but aggregated in SQL"""
+    deltas = _deltas()
+    rows = (
+        queryset.order_by()
+        .values('status', day=TruncDate('created_at'))
+        .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+    )
+    for row in rows:
+        count = sign * row['orders']
+        amount = sign * (row['revenue'] or ZERO)
+        for key in (
+            (CRMSummary.TOTAL, ORDERS),
+            (CRMSummary.STATUS, row['status']),
+            (CRMSummary.DAY, row['day'].isoformat()),
+        ):
+            deltas[key][0] += count
+            deltas[key][1] += amount
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add ``deltas`` to the summary rows with ``count = count + n`` updates"""
+    now = timezone.now()
+    days = [key for (kind, key), (count, revenue) in deltas.items()
+            if kind == CRMSummary.DAY and (count or revenue)]
+    if days and min(days) < timezone.localdate(now).isoformat():
+        # A closed day (and its week/month) changed: drop the cached sales stats
+        transaction.on_commit(invalidate_sales_stats)
+    # Always lock the rows in the same order so concurrent writers cannot deadlock
+    for (kind, key), (count, revenue) in sorted(deltas.items()):
+        if not count and not revenue:
+            continue
+        rows = CRMSummary.objects.filter(kind=kind, key=key)
+        increment = {'count': F('count') + count, 'revenue': F('revenue') + revenue, 'updated_at': now}
+        if rows.update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                CRMSummary.objects.create(kind=kind, key=key, count=count, revenue=revenue)
+        except IntegrityError:
+            # Another transaction created the row first
+            rows.update(**increment)
+
+
+def record_customers(count):
+    apply_deltas({(CRMSummary.TOTAL, CUSTOMERS): [count, ZERO]})
+
+
+def record_orders(orders):
+    apply_deltas(order_deltas(orders))
+
+
+SUMMARY_FIELDS = {'status', 'total_amount', 'created_at'}
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, using, **kwargs):
+    if created:
+        with transaction.atomic(using=using):
+            record_customers(1)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, using, **kwargs):
+    with transaction.atomic(using=using):
+        record_customers(-1)
+
+
+@receiver(pre_save, sender=Order)
+def order_saving(sender, instance, using, update_fields=None, **kwargs):
+    # The stored values an update replaces, to take them out of the summary
+    instance._summary_before = None
+    if instance._state.adding or (update_fields is not None and not SUMMARY_FIELDS & set(update_fields)):
+        return
+    instance._summary_before = (
+        Order.objects.using(using).filter(pk=instance.pk).only(*SUMMARY_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, using, **kwargs):
+    before = getattr(instance, '_summary_before', None)
+    if not created and before is None:
+        # Nothing the summary counts was changed
+        return
+    deltas = order_deltas([instance])
+    if not created:
+        for key, (count, revenue) in order_deltas([before], sign=-1).items():
+            deltas[key][0] += count
+            deltas[key][1] += revenue
+    with transaction.atomic(using=using):
+        apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, using, **kwargs):
+    with transaction.atomic(using=using):
+        apply_deltas(order_deltas([instance], sign=-1))
+
+
+def get_totals():
+    """Return ``{'customers', 'orders', 'revenue', 'by_status'}`` from the summary"""
+    totals = {'customers': 0, 'orders': 0, 'revenue': ZERO, 'by_status': {}}
+    rows = CRMSummary.objects.filter(kind__in=[CRMSummary.TOTAL, CRMSummary.STATUS])
+    for row in rows:
+        if row.kind == CRMSummary.STATUS:
+            totals['by_status'][row.key] = row.count
+        elif row.key == CUSTOMERS:
+            totals['customers'] = row.count
+        elif row.key == ORDERS:
+            totals['orders'] = row.count
+            totals['revenue'] = row.revenue
+    return totals
+
+
+def daily_orders(start=None, end=None):
+    """Return ``[(date, orders, revenue), ...]`` for the days in ``[start, end]``"""
+    rows = CRMSummary.objects.filter(kind=CRMSummary.DAY)
+    if start is not None:
+        rows = rows.filter(key__gte=start.isoformat())
+    if end is not None:
+        rows = rows.filter(key__lte=end.isoformat())
+    return [
+        (date.fromisoformat(row.key), row.count, row.revenue)
+        for row in rows.order_by('key')
+    ]
+
+
+def reconcile():
+    """Recompute every summary row from the source tables.
+
+    Returns the number of rows that had drifted. The counters are locked
+    first, so increments from concurrent writers wait for the rebuild and are
+    applied on top of it.
+    """
+    with transaction.atomic():
+        current = {(row.kind, row.key): row for row in CRMSummary.objects.select_for_update()}
+        expected = queryset_order_deltas(Order.objects.all())
+        expected.setdefault((CRMSummary.TOTAL, ORDERS), [0, ZERO])
+        expected[(CRMSummary.TOTAL, CUSTOMERS)] = [Customer.objects.count(), ZERO]
+
+        fixed = 0
+        missing = []
+        for (kind, key), (count, revenue) in expected.items():
+            row = current.pop((kind, key), None)
+            if row is None:
+                missing.append(CRMSummary(kind=kind, key=key, count=count, revenue=revenue))
+            elif row.count != count or row.revenue != revenue:
+                row.count, row.revenue = count, revenue
+                row.save(update_fields=['count', 'revenue', 'updated_at'])
+                fixed += 1
+        CRMSummary.objects.bulk_create(missing)
+        # Statuses and days without any order left; zeroed ones were not drift
+        CRMSummary.objects.filter(pk__in=[row.pk for row in current.values()]).delete()
+        fixed += sum(1 for row in current.values() if row.count or row.revenue)
+    fixed += len(missing)
+    if fixed:
+        invalidate_sales_stats()
+    return fixed
@@ -2,10 +2,10 @@ import os
 import logging
 import requests
 from datetime import datetime
-from celery import shared_task
-from django.db import transaction
-from crm.models import Customer, Order
-from django.db.models import Sum
+from celery import group, shared_task
+from crm import exports
+from crm.routing import use_replicas
+from crm.summary import get_totals, reconcile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,18 +18,13 @@ def generate_crm_report():
     Logs the report to /tmp/crm_report_log.txt with timestamp.
     """
     try:
-        # Use Django ORM to fetch data (equivalent to GraphQL queries)
-        with transaction.atomic():
-            # Total number of customers
-            total_customers = Customer.objects.count()
-            
-            # Total number of orders
-            total_orders = Order.objects.count()
-            
-            # Total revenue (sum of totalamount from orders)
-            total_revenue = Order.objects.aggregate(
-                total=Sum('totalamount')
-            )['total'] or 0
+        # Read the running totals instead of scanning the tables (see crm/summary.py),
+        # from a read replica when one is configured
+        with use_replicas():
+            totals = get_totals()
+        total_customers = totals['customers']
+        total_orders = totals['orders']
+        total_revenue = totals['revenue']
             
         # Format the report
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -92,6 +87,87 @@ def generate_crm_report():
             'message': error_message
         }
 
+@shared_task
+def reconcile_crm_summary():
+    """
+    Recompute the CRM summary rows from the customer and order tables
+    and repair any drift from writes that bypass the summary.
+    """
+    fixed = reconcile()
+    if fixed:
+        logger.warning(f"CRM summary reconciled: {fixed} rows had drifted")
+    else:
+        logger.info("CRM summary reconciled: no drift")
+    return {'status': 'success', 'fixed': fixed}
+
+@shared_task
+def export_crm_partition(kind, fmt, start, end, period='day', overwrite=False):
+    """
+    Write one date partition of a bulk export (see crm/exports.py).
+    Already exported partitions are skipped unless overwrite is set.
+    """
+    with use_replicas():
+        result = exports.export_partition(kind, fmt, start, end, period, overwrite)
+    logger.info(f"Export partition {result['path']}: {result['rows']} rows, skipped={result['skipped']}")
+    return result
+
+@shared_task(bind=True)
+def export_crm_data(self, kind, fmt='csv', start=None, end=None, period='day',
+                    overwrite=False, parallel=False):
+    """
+    Export customers or orders created in [start, end) to gzip-compressed
+    CSV or NDJSON files under CRM_EXPORT_DIR, one file per day, week or month.
+
+    Partitions whose file already exists are skipped, so rerunning the task
+    resumes an interrupted export. Progress is reported through the task
+    state (PROGRESS with done/total). The period still open at end (e.g.
+    today) is not exported; the result names it as open_partition. With
+    parallel=True each partition is dispatched as its own
+    export_crm_partition task and the group id is returned instead; track
+    it with GroupResult.completed_count().
+    """
+    left_out = exports.open_partition(kind, start, end, period)
+    if left_out is not None:
+        left_out = [moment.isoformat() for moment in left_out]
+        logger.warning(f"Export of {kind}: partition {left_out[0]} - {left_out[1]} is still open, skipped")
+
+    if parallel:
+        pending = exports.partitions(kind, start, end, period)
+        job = group(
+            export_crm_partition.s(
+                kind, fmt, partition_start.isoformat(), partition_end.isoformat(),
+                period, overwrite,
+            )
+            for partition_start, partition_end in pending
+        ).apply_async()
+        job.save()
+        return {'status': 'dispatched', 'group_id': job.id, 'partitions': len(pending),
+                'open_partition': left_out}
+
+    def progress(done, total, result):
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta={
+                'done': done, 'total': total, 'last': result['path'],
+            })
+
+    with use_replicas():
+        results = exports.export(kind, fmt, start, end, period, overwrite, progress=progress)
+    written = [result for result in results if not result['skipped']]
+    rows = sum(result['rows'] for result in written)
+    logger.info(
+        f"Exported {kind}: {len(written)} partitions written, "
+        f"{len(results) - len(written)} already done, {rows} rows"
+    )
+    return {
+        'status': 'success',
+        'partitions': len(results),
+        'written': len(written),
+        'skipped': len(results) - len(written),
+        'rows': rows,
+        # [start, end] of the period still open at end, not exported
+        'open_partition': left_out,
+    }
+
 @shared_task
 def test_celery_connection():
     """
@@ -0,0 +1,841 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gql import gql
+from gql.transport.exceptions import TransportServerError
+
+from crm import analytics, exports, graphql_client, response_cache, routing
+from crm import schema as schema_module
+from crm.inventory import reserve_stock, restock_low_stock
+from crm.models import Customer, Order, Product
+from crm.persisted import query_hash
+from crm.schema import generate_order_numbers, schema
+from crm.search import search_customers
+from crm.summary import get_totals, reconcile, record_orders
+from crm.tracing import NPlusOneDetected
+
+
+def create_orders(count, products_per_order=3):
+    """``count`` orders, each for its own customer and with its own products"""
+    orders = []
+    start = Order.objects.count()
+    for index in range(start, start + count):
+        customer = Customer.objects.create(
+            first_name=f'Customer{index}', last_name='Test', email=f'customer{index}@example.com',
+        )
+        order = Order.objects.create(
+            customer=customer, order_number=f'ORD-{index:08d}', total_amount=Decimal('10.00'),
+        )
+        order.products.set([
+            Product.objects.create(name=f'P{index}-{n}', price=Decimal('5.00'), stock=n)
+            for n in range(products_per_order)
+        ])
+        orders.append(order)
+    return orders
+
+
+@override_settings(GRAPHQL_TRACING_STRICT=True)
+class GraphQLTestCase(TestCase):
+    """Requests fail with ``NPlusOneDetected`` when a field queries per list item"""
+
+    def query(self, document, variables=None, path='/graphql/'):
+        response = self.client.post(
+            path, json.dumps({'query': document, 'variables': variables or {}}),
+            content_type='application/json',
+        )
+        return response.json()
+
+    def count_queries(self, document, variables=None):
+        """``(number of SQL statements, response)`` for one request"""
+        with CaptureQueriesContext(connection) as queries:
+            result = self.query(document, variables)
+        self.assertNotIn('errors', result)
+        return len(queries), result
+
+
+class QueryCountTests(GraphQLTestCase):
+    """Nested relations cost a constant number of statements per request"""
+
+    ORDERS = '{ allOrders(first: 50) { edges { node { orderNumber customer { email } products { name } } } } }'
+    CUSTOMER_ORDERS = (
+        '{ allCustomers(first: 50) { edges { node { email '
+        'orders { orderNumber customer { email } products { name } } } } } }'
+    )
+    PRODUCT_ORDERS = (
+        '{ allProducts(first: 50) { edges { node { name '
+        'orders { orderNumber customer { email } products { name } } } } } }'
+    )
+
+    def assertConstantQueries(self, document, expected):
+        create_orders(2)
+        few, result = self.count_queries(document)
+        create_orders(8)
+        many, more = self.count_queries(document)
+        self.assertEqual(few, expected)
+        self.assertEqual(many, expected)
+        self.assertGreater(len(json.dumps(more)), len(json.dumps(result)))
+
+    def test_all_orders_with_customer_and_products(self):
+        self.assertConstantQueries(self.ORDERS, 2)
+
+    def test_orders_nested_under_customers(self):
+        self.assertConstantQueries(self.CUSTOMER_ORDERS, 3)
+
+    def test_orders_nested_under_products(self):
+        self.assertConstantQueries(self.PRODUCT_ORDERS, 3)
+
+    def test_orders_nested_under_low_stock_products(self):
+        self.assertConstantQueries('{ lowStockProducts { name orders { customer { email } } } }', 2)
+
+    def test_relation_selected_twice(self):
+        create_orders(3)
+        document = (
+            'fragment F on OrderType { products { name } } '
+            '{ allOrders(first: 3) { edges { node { ...F products { price } } } } }'
+        )
+        count, result = self.count_queries(document)
+        self.assertEqual(count, 2)
+        products = result['data']['allOrders']['edges'][0]['node']['products']
+        self.assertEqual(set(products[0]), {'name', 'price'})
+
+    def test_order_lookups_are_batched(self):
+        orders = create_orders(3)
+        count, result = self.count_queries(
+            '{ a: order(id: %d) { customer { email } products { name } } '
+            'b: order(id: %d) { customer { email } products { name } } }' % (orders[0].pk, orders[1].pk)
+        )
+        self.assertEqual(count, 3)
+        self.assertEqual(result['data']['b']['customer']['email'], 'customer1@example.com')
+
+
+class StrictTracingTests(GraphQLTestCase):
+    DOCUMENT = '{ allOrders(first: 10) { edges { node { orderNumber customer { email } } } } }'
+
+    def test_batched_relations_pass(self):
+        create_orders(5)
+        result = self.query(self.DOCUMENT)
+        self.assertEqual(len(result['data']['allOrders']['edges']), 5)
+
+    def test_n_plus_one_fails(self):
+        create_orders(5)
+        customer = schema.graphql_schema.get_type('OrderType').fields['customer']
+
+        def per_order(order, info):
+            # What the default resolver does without the loaders
+            return Customer.objects.get(pk=order.customer_id)
+
+        with mock.patch.object(customer, 'resolve', per_order):
+            with self.assertRaisesRegex(NPlusOneDetected, r'allOrders\.edges\.node\.customer ran 5x'):
+                self.query(self.DOCUMENT)
+
+    @override_settings(GRAPHQL_TRACING=True)
+    def test_trace_extension(self):
+        create_orders(3)
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': self.DOCUMENT, 'extensions': {'tracing': True}}),
+            content_type='application/json',
+        )
+        trace = response.json()['extensions']['tracing']
+        self.assertEqual(trace['nPlusOne'], [])
+        resolvers = {tuple(field['path']): field for field in trace['execution']['resolvers']}
+        self.assertGreater(resolvers['allOrders',]['sqlCount'], 0)
+        self.assertIn(('allOrders', 'edges', 2, 'node', 'customer'), resolvers)
+
+    @override_settings(GRAPHQL_TRACING=True)
+    def test_returned_querysets_are_not_evaluated_by_the_tracer(self):
+        create_orders(2)
+        document = '{ lowStockProducts { name } }'
+        with CaptureQueriesContext(connection) as untraced:
+            self.query(document)
+        with CaptureQueriesContext(connection) as traced:
+            response = self.client.post(
+                '/graphql/', json.dumps({'query': document, 'extensions': {'tracing': True}}),
+                content_type='application/json',
+            )
+        self.assertEqual([query['sql'] for query in traced], [query['sql'] for query in untraced])
+        resolvers = response.json()['extensions']['tracing']['execution']['resolvers']
+        # Evaluated by GraphQL after the resolver returned, still charged to it
+        self.assertEqual(resolvers[0]['path'], ['lowStockProducts'])
+        self.assertEqual(resolvers[0]['sqlCount'], 1)
+
+    def test_n_plus_one_of_lazy_querysets_fails(self):
+        create_orders(5)
+        products = schema.graphql_schema.get_type('OrderType').fields['products']
+        # A filtered queryset per order, which the prefetched products cannot serve
+        with mock.patch.object(products, 'resolve', lambda order, info: order.products.filter(stock__gte=0)):
+            with self.assertRaisesRegex(NPlusOneDetected, r'allOrders\.edges\.node\.products ran 5x'):
+                self.query('{ allOrders(first: 10) { edges { node { products { name } } } } }')
+
+
+class IndexUsageTests(TestCase):
+    """The hot filters and orderings are answered from the 0002 indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        customers = Customer.objects.bulk_create([
+            Customer(
+                first_name=f'C{index}', last_name='Test', email=f'c{index}@example.com',
+                is_active=index % 10 != 0, created_at=now - timedelta(days=index),
+            )
+            for index in range(300)
+        ])
+        Order.objects.bulk_create([
+            Order(
+                customer=customers[index % len(customers)], order_number=f'IDX-{index}',
+                total_amount=Decimal('10.00'), status=Order.STATUS_CHOICES[index % 5][0],
+                created_at=now - timedelta(hours=index),
+            )
+            for index in range(1000)
+        ])
+        Product.objects.bulk_create([
+            Product(name=f'P{index}', price=Decimal('1.00'), stock=index) for index in range(300)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        if connection.vendor == 'sqlite':
+            self.assertRegex(plan, rf'(SEARCH|SCAN) \w+ USING (COVERING )?INDEX {index}\b')
+
+    def test_orders_of_a_customer(self):
+        customer = Customer.objects.first()
+        self.assertUsesIndex(
+            Order.objects.filter(customer=customer).order_by('-created_at'), 'crm_order_customer_idx',
+        )
+
+    def test_orders_by_status_since(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Order.objects.filter(status='pending', created_at__gte=since), 'crm_order_status_idx',
+        )
+
+    def test_active_customers_since(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(
+            Customer.objects.filter(is_active=True, created_at__gte=since), 'crm_customer_active_idx',
+        )
+
+    def test_low_stock_products(self):
+        # The restock UPDATE filters without ordering
+        self.assertUsesIndex(Product.objects.filter(stock__lt=10).order_by(), 'crm_product_low_stock_idx')
+
+    def test_default_orderings(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at', '-id')[:10], 'crm_order_created_idx')
+        self.assertUsesIndex(Customer.objects.order_by('-created_at', '-id')[:10], 'crm_customer_created_idx')
+        self.assertUsesIndex(Product.objects.order_by('name', 'id')[:10], 'crm_product_name_idx')
+
+
+@override_settings(CRM_DB_REPLICAS=['replica'], CRM_DB_REPLICA_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second SQLite file stands in for a read replica of the test database.
+
+    The alias is added after the test databases are set up: each test copies
+    the primary into it, so it never needs creating or flushing.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        routing._lag_checks.clear()
+        Product.objects.create(name='Everywhere', price=Decimal('1.00'), stock=1)
+        # "Replicate": copy the primary into the replica file
+        for alias in ('default', 'replica'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(connections['replica'].connection)
+        Product.objects.using('replica').create(name='Replica only', price=Decimal('1.00'), stock=1)
+
+    def product_names(self):
+        result = self.client.post(
+            '/graphql/', json.dumps({'query': '{ allProducts(first: 10) { edges { node { name } } } }'}),
+            content_type='application/json',
+        ).json()
+        return {edge['node']['name'] for edge in result['data']['allProducts']['edges']}
+
+    def test_queries_read_from_the_replica(self):
+        self.assertEqual(self.product_names(), {'Everywhere', 'Replica only'})
+
+    def test_mutations_write_to_the_primary_and_pin_the_client(self):
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': 'mutation { createProduct(input: {name: "New", price: "2.00", stock: 1}) '
+                                 '{ product { name } } }'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['data']['createProduct']['product']['name'], 'New')
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        self.assertTrue(Product.objects.using('default').filter(name='New').exists())
+        self.assertFalse(Product.objects.using('replica').filter(name='New').exists())
+        # The pin cookie keeps the client's next reads on the primary
+        self.assertEqual(self.product_names(), {'Everywhere', 'New'})
+
+    def test_use_primary(self):
+        with routing.use_replicas():
+            self.assertTrue(Product.objects.filter(name='Replica only').exists())
+            with routing.use_primary():
+                self.assertFalse(Product.objects.filter(name='Replica only').exists())
+            self.assertTrue(Product.objects.filter(name='Replica only').exists())
+
+    def test_restock_writes_to_the_primary(self):
+        with routing.use_replicas():
+            products = restock_low_stock()
+        self.assertEqual([(product.name, product.stock) for product in products], [('Everywhere', 11)])
+        self.assertEqual(products[0].price, Decimal('1.00'))
+        self.assertEqual(Product.objects.using('default').get(name='Everywhere').stock, 11)
+        self.assertEqual(Product.objects.using('replica').get(name='Everywhere').stock, 1)
+
+    def test_lagging_replica_is_skipped(self):
+        with override_settings(CRM_DB_REPLICA_MAX_LAG=-1):
+            self.assertEqual(self.product_names(), {'Everywhere'})
+
+    def test_routing_state_is_reset_after_each_request(self):
+        self.product_names()
+        self.assertIsNone(routing._state.get())
+        self.assertFalse(Product.objects.filter(name='Replica only').exists())
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    def post(self, extensions):
+        return self.client.post(
+            '/graphql/', json.dumps({'query': '{ hello }', 'extensions': extensions}),
+            content_type='application/json',
+        )
+
+    def test_malformed_extensions_are_a_bad_request(self):
+        for extensions in (['persistedQuery'], 'not json', '"a string"', {'persistedQuery': 1}):
+            with self.subTest(extensions=extensions):
+                response = self.post(extensions)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('errors', response.json())
+
+    def test_matching_hash_is_accepted(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash('{ hello }')}}
+        response = self.post(extensions)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hello', response.json()['data'])
+
+
+class CustomerSearchTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for first_name, last_name, email in (('Wei', 'Li', 'wei@example.com'),
+                                             ('José', 'García', 'jose@sample.org'),
+                                             ('Lina', 'Smith', 'lsmith@example.com')):
+            Customer.objects.create(first_name=first_name, last_name=last_name, email=email)
+
+    def emails(self, queryset):
+        return sorted(queryset.values_list('email', flat=True))
+
+    def test_short_term_matches_any_word(self):
+        self.assertEqual(self.emails(search_customers(Customer.objects.all(), 'li')),
+                         ['lsmith@example.com', 'wei@example.com'])
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.emails(search_customers(Customer.objects.all(), 'GARCIA jo')),
+                         ['jose@sample.org'])
+
+    def test_email_filter(self):
+        result = self.query('{ allCustomers(email: "@example") { edges { node { email } } } }')
+        emails = sorted(edge['node']['email'] for edge in result['data']['allCustomers']['edges'])
+        self.assertEqual(emails, ['lsmith@example.com', 'wei@example.com'])
+        # Names are in search_text too, but the email filter only matches emails
+        result = self.query('{ allCustomers(email: "smith@") { edges { node { email } } } }')
+        self.assertEqual(len(result['data']['allCustomers']['edges']), 1)
+        result = self.query('{ allCustomers(email: "Wei Li") { edges { node { email } } } }')
+        self.assertEqual(result['data']['allCustomers']['edges'], [])
+
+    def test_email_filter_matches_short_substrings(self):
+        # Neither "mi" nor "e.o" starts a word of search_text
+        for value, expected in (('mi', ['lsmith@example.com']),
+                                ('e.o', ['jose@sample.org']),
+                                ('ith@ex', ['lsmith@example.com'])):
+            result = self.query('query ($email: String) { allCustomers(email: $email) '
+                                '{ edges { node { email } } } }', {'email': value})
+            self.assertEqual([edge['node']['email'] for edge in result['data']['allCustomers']['edges']],
+                             expected)
+
+    def test_update_refreshes_search_text(self):
+        Customer.objects.filter(email='wei@example.com').update(last_name='Zhang')
+        self.assertEqual(self.emails(search_customers(Customer.objects.all(), 'zhang')),
+                         ['wei@example.com'])
+        customer = Customer.objects.get(email='jose@sample.org')
+        customer.last_name = 'Pérez'
+        Customer.objects.bulk_update([customer], ['last_name'])
+        self.assertEqual(self.emails(search_customers(Customer.objects.all(), 'perez')),
+                         ['jose@sample.org'])
+
+
+@override_settings(CRM_EXPORT_DIR=tempfile.gettempdir())
+class ExportPartitionTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.customers = [
+            Customer.objects.create(first_name=f'E{hours}', email=f'e{hours}@example.com',
+                                    created_at=self.today - timedelta(hours=hours))
+            for hours in (1, 20, 30, 50)
+        ]
+
+    def test_first_partition_starts_at_start(self):
+        start = self.today - timedelta(hours=21)
+        pending = exports.partitions('customers', start=start, period='day')
+        self.assertEqual(pending, [(start, self.today)])
+        rows = [row['email'] for chunk in exports.iter_rows('customers', *pending[0]) for row in chunk]
+        self.assertEqual(sorted(rows), ['e1@example.com', 'e20@example.com'])
+        self.assertIn('.partial.', exports.partition_path('customers', 'csv', 'day', start).name)
+        self.assertNotIn('.partial.', exports.partition_path('customers', 'csv', 'day', self.today).name)
+
+    def test_open_partition_is_reported(self):
+        pending = exports.partitions('customers', period='day')
+        self.assertEqual(pending[-1][1], self.today)
+        left_out = exports.open_partition('customers', period='day')
+        self.assertEqual(left_out[0], self.today)
+
+
+@override_settings(CRM_SALES_STATS_CACHE=True)
+class SalesStatsCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.customer = Customer.objects.create(first_name='Sales', email='sales@example.com')
+        for days in (1, 2, 2):
+            self.create_order(days)
+
+    def create_order(self, days_ago):
+        return Order.objects.create(
+            customer=self.customer, order_number=f'ORD-S{Order.objects.count():05d}',
+            total_amount=Decimal('10.00'), created_at=self.today - timedelta(days=days_ago, hours=-1),
+        )
+
+    def stats(self):
+        rows = analytics.sales_stats(analytics.DAY, start=self.today - timedelta(days=3), end=self.today)
+        return [(row['order_count'], row['revenue']) for row in rows]
+
+    def test_closed_buckets_are_cached(self):
+        self.assertEqual(self.stats(), [(0, Decimal('0.00')), (2, Decimal('20.00')), (1, Decimal('10.00'))])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.stats()[1], (2, Decimal('20.00')))
+        # A per-process cache only keeps them for CRM_SALES_STATS_CACHE_TTL
+        self.assertEqual(analytics._closed_timeout(analytics.get_cache()), analytics.DEFAULT_CACHE_TTL)
+
+    def test_back_dated_order_invalidates_closed_buckets(self):
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            record_orders([self.create_order(2)])
+        self.assertEqual(self.stats()[1], (3, Decimal('30.00')))
+
+    @override_settings(CRM_SALES_STATS_CACHE=False)
+    def test_cache_is_opt_in(self):
+        self.stats()
+        with self.assertNumQueries(1):
+            self.stats()
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        create_orders(3, products_per_order=0)
+
+    def test_anonymous_requests_are_rejected(self):
+        for path in ('/crm/customers/', '/crm/orders/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/admin/login/', response['Location'])
+
+    def test_staff_pages_through_the_export(self):
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        first = self.client.get('/crm/customers/', {'limit': 2})
+        page = json.loads(b''.join(first.streaming_content))
+        self.assertEqual(len(page['results']), 2)
+        second = self.client.get('/crm/customers/', {'limit': 2, 'after': page['next']})
+        rest = json.loads(b''.join(second.streaming_content))
+        self.assertEqual([row['email'] for row in rest['results']], ['customer0@example.com'])
+        self.assertIsNone(rest['next'])
+
+
+class GraphQLClientRetryTests(SimpleTestCase):
+    def setUp(self):
+        self.posts = []
+        posts = self.posts
+
+        class FailingHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                posts.append(self.rfile.read(int(self.headers['Content-Length'])))
+                self.send_response(502)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FailingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(graphql_client.close_clients)
+        self.url = f'http://127.0.0.1:{server.server_port}/graphql/'
+
+    def test_failed_mutation_is_not_sent_again(self):
+        with override_settings(CRM_GRAPHQL_URL=self.url, CRM_GRAPHQL_RETRIES=3,
+                               CRM_GRAPHQL_RETRY_BACKOFF=0):
+            session = graphql_client.get_client('http')
+            with self.assertRaises(TransportServerError):
+                session.execute(gql('mutation { updateLowStockProducts { message } }'))
+        self.assertEqual(len(self.posts), 1)
+
+
+class AsyncGraphQLViewTests(TransactionTestCase):
+    """Field threads have their own connections, so the rows must be committed"""
+
+    def setUp(self):
+        create_orders(2, products_per_order=2)
+
+    async def query(self, document):
+        response = await AsyncClient().post(
+            '/graphql/async/', json.dumps({'query': document}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_root_fields_resolve_on_their_own_threads(self):
+        threads = {}
+
+        def resolve(field_name):
+            def resolver(root, info, **kwargs):
+                threads[field_name] = threading.current_thread().name
+                return 'world'
+            return resolver
+
+        with mock.patch.object(schema.graphql_schema.query_type.fields['hello'], 'resolve', resolve('hello')):
+            result = await self.query('{ lowStockProducts { name } allOrders(first: 5) '
+                                      '{ edges { node { customer { email } products { name } } } } hello }')
+        self.assertNotIn('errors', result)
+        self.assertEqual(len(result['data']['lowStockProducts']), 4)
+        orders = [edge['node'] for edge in result['data']['allOrders']['edges']]
+        self.assertEqual([order['customer']['email'] for order in orders],
+                         ['customer1@example.com', 'customer0@example.com'])
+        self.assertEqual([len(order['products']) for order in orders], [2, 2])
+        self.assertTrue(threads['hello'].startswith('graphql-field'))
+
+    async def test_mutation(self):
+        result = await self.query('mutation { createCustomer(input: {name: "Async Client", '
+                                  'email: "async@example.com"}) { customer { email } } }')
+        self.assertEqual(result['data']['createCustomer']['customer']['email'], 'async@example.com')
+        self.assertTrue(await Customer.objects.filter(email='async@example.com').aexists())
+
+
+class BulkCreateOrdersTests(GraphQLTestCase):
+    MUTATION = '''
+    mutation ($input: [OrderInput]!, $chunkSize: Int) {
+      bulkCreateOrders(input: $input, chunkSize: $chunkSize) {
+        orders { totalAmount customer { email } } errors message
+      }
+    }
+    '''
+
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name='Bulk', email='bulk@example.com')
+        self.scarce = Product.objects.create(name='Scarce', price=Decimal('3.00'), stock=1)
+        self.plenty = Product.objects.create(name='Plenty', price=Decimal('2.00'), stock=5)
+
+    def order(self, *products, customer=None):
+        return {'customerId': str((customer or self.customer).pk),
+                'productIds': [str(product.pk) for product in products]}
+
+    def test_bad_row_leaves_the_rest_of_its_chunk_committed(self):
+        result = self.query(self.MUTATION, {'chunkSize': 10, 'input': [
+            self.order(self.plenty),
+            # Two units of a product with one in stock: fails in the database
+            self.order(self.scarce, self.scarce),
+            self.order(self.plenty, self.scarce),
+        ]})['data']['bulkCreateOrders']
+        self.assertEqual(result['errors'], [f'Order 2: Insufficient stock for product ID: {self.scarce.pk}'])
+        self.assertEqual([order['totalAmount'] for order in result['orders']], ['2.00', '5.00'])
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 2)
+        self.plenty.refresh_from_db()
+        self.scarce.refresh_from_db()
+        self.assertEqual((self.plenty.stock, self.scarce.stock), (3, 0))
+
+    def test_validation_errors_are_reported_per_row(self):
+        result = self.query(self.MUTATION, {'chunkSize': 1, 'input': [
+            {'customerId': '0', 'productIds': [str(self.plenty.pk)]},
+            self.order(self.plenty),
+            {'customerId': str(self.customer.pk), 'productIds': ['0', 'x']},
+        ]})['data']['bulkCreateOrders']
+        self.assertEqual(result['errors'], ['Order 1: Invalid customer ID',
+                                            'Order 3: Invalid product ID: x, 0'])
+        self.assertEqual(len(result['orders']), 1)
+
+    def test_generated_order_numbers_skip_taken_ones(self):
+        Order.objects.create(customer=self.customer, order_number='ORD-AAAAAAAA', total_amount=Decimal('1.00'))
+        uuids = [mock.Mock(hex=letter * 32) for letter in 'abbc']
+        with mock.patch('crm.schema.uuid.uuid4', side_effect=uuids):
+            self.assertEqual(sorted(generate_order_numbers(2)), ['ORD-BBBBBBBB', 'ORD-CCCCCCCC'])
+
+
+class StockReservationTests(GraphQLTestCase):
+    MUTATION = '''
+    mutation ($input: OrderInput!) {
+      createOrder(input: $input) { order { totalAmount products { name } } errors { field message } }
+    }
+    '''
+
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name='Stock', email='stock@example.com')
+        self.widget = Product.objects.create(name='Widget', price=Decimal('4.00'), stock=3)
+        self.gadget = Product.objects.create(name='Gadget', price=Decimal('6.00'), stock=1)
+
+    def stock(self):
+        return dict(Product.objects.values_list('name', 'stock'))
+
+    def create_order(self, *products):
+        return self.query(self.MUTATION, {'input': {
+            'customerId': str(self.customer.pk), 'productIds': [str(product.pk) for product in products],
+        }})['data']['createOrder']
+
+    def test_reserve_stock_is_conditional(self):
+        self.assertEqual(reserve_stock({self.widget.pk: 2}), [])
+        self.assertEqual(self.stock(), {'Widget': 1, 'Gadget': 1})
+        # All or nothing: the gadget is not taken when the widgets are short
+        self.assertEqual(reserve_stock({self.widget.pk: 2, self.gadget.pk: 1}), [self.widget.pk])
+        self.assertEqual(self.stock(), {'Widget': 1, 'Gadget': 1})
+
+    def test_repeated_product_ids_are_quantities(self):
+        result = self.create_order(self.widget, self.widget, self.gadget)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['order']['totalAmount'], '14.00')
+        self.assertEqual(self.stock(), {'Widget': 1, 'Gadget': 0})
+
+    def test_insufficient_stock_rolls_back(self):
+        result = self.create_order(self.widget, self.gadget, self.gadget)
+        self.assertIsNone(result['order'])
+        self.assertEqual(result['errors'], [{
+            'field': 'product_ids', 'message': f'Insufficient stock for product ID: {self.gadget.pk}',
+        }])
+        self.assertEqual(self.stock(), {'Widget': 3, 'Gadget': 1})
+        self.assertFalse(Order.objects.exists())
+
+
+class BulkCreateCustomersTests(GraphQLTestCase):
+    MUTATION = '''
+    mutation ($input: [CustomerInput]!) {
+      bulkCreateCustomers(input: $input) { customers { email } errors message }
+    }
+    '''
+
+    def setUp(self):
+        Customer.objects.create(first_name='Taken', email='taken@example.com')
+
+    def bulk_create(self, customers):
+        return self.query(self.MUTATION, {'input': customers})['data']['bulkCreateCustomers']
+
+    def test_duplicates_in_the_database_and_the_batch(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.bulk_create([
+                {'name': 'Ann One', 'email': 'ann@example.com'},
+                {'name': 'Taken Again', 'email': 'taken@example.com'},
+                {'name': 'Ann Two', 'email': 'ann@example.com'},
+                {'name': 'Bad Email', 'email': 'not-an-email'},
+                {'name': 'Bad Phone', 'email': 'phone@example.com', 'phone': 'call me'},
+            ])
+        self.assertEqual(result['errors'], [
+            'Customer 2: Email already exists',
+            'Customer 3: Email already exists',
+            'Customer 4: Invalid email format',
+            'Customer 5: Invalid phone format',
+        ])
+        self.assertEqual(result['customers'], [{'email': 'ann@example.com'}])
+        self.assertEqual(result['message'], 'Successfully created 1 customers. 4 failed.')
+        self.assertEqual(Customer.objects.count(), 2)
+        # One set-based uniqueness check, one INSERT for the batch
+        statements = [query['sql'].split(' ', 1)[0] for query in queries.captured_queries
+                      if '"crm_customer"' in query['sql']]
+        self.assertEqual(statements, ['SELECT', 'INSERT'])
+
+    def test_concurrent_insert_falls_back_to_one_savepoint_per_row(self):
+        validate_phone_format = schema_module.validate_phone_format
+
+        def insert_concurrently(phone):
+            # Another request creates the same email after the uniqueness check
+            if not Customer.objects.filter(email='race@example.com').exists():
+                Customer.objects.create(first_name='Racer', email='race@example.com')
+            return validate_phone_format(phone)
+
+        with mock.patch('crm.schema.validate_phone_format', side_effect=insert_concurrently):
+            result = self.bulk_create([
+                {'name': 'Ann One', 'email': 'ann@example.com', 'phone': '+1234567890'},
+                {'name': 'Race Lost', 'email': 'race@example.com', 'phone': '+1234567890'},
+                {'name': 'Bob Two', 'email': 'bob@example.com', 'phone': '+1234567890'},
+            ])
+        self.assertEqual([customer['email'] for customer in result['customers']],
+                         ['ann@example.com', 'bob@example.com'])
+        self.assertEqual(len(result['errors']), 1)
+        self.assertTrue(result['errors'][0].startswith('Customer 2: UNIQUE constraint failed'))
+        self.assertEqual(Customer.objects.filter(email='race@example.com').get().first_name, 'Racer')
+
+
+class QueryLimitTests(GraphQLTestCase):
+    PRODUCTS = '{ allProducts(first: 5) { edges { node { name } } } }'
+
+    def post(self, document):
+        return self.client.post('/graphql/', json.dumps({'query': document}),
+                                content_type='application/json')
+
+    def test_cost_is_reported_in_the_extensions(self):
+        response = self.post(self.PRODUCTS)
+        self.assertEqual(response.status_code, 200)
+        # allProducts 1 + edges 1 + 5 nodes
+        self.assertEqual(response.json()['extensions']['cost'], {'requested': 7, 'maximum': 10000})
+
+    @override_settings(GRAPHQL_MAX_QUERY_COST=6)
+    def test_over_cost_documents_are_rejected(self):
+        with mock.patch.object(schema.graphql_schema.query_type.fields['allProducts'], 'resolve') as resolve:
+            response = self.post(self.PRODUCTS)
+        resolve.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        result = response.json()
+        self.assertEqual(result['errors'][0]['message'], 'Query cost 7 exceeds the maximum allowed cost of 6.')
+        self.assertEqual(result['extensions']['cost'], {'requested': 7, 'maximum': 6})
+
+    @override_settings(GRAPHQL_MAX_QUERY_DEPTH=3)
+    def test_over_depth_documents_are_rejected(self):
+        response = self.post('{ allOrders(first: 1) { edges { node { customer { email } } } } }')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceeds maximum operation depth of 3', response.json()['errors'][0]['message'])
+        self.assertEqual(self.post(self.PRODUCTS).status_code, 200)
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    ORDERS = '''
+    query ($first: Int, $after: String, $createdAfter: DateTime, $status: String) {
+      allOrders(first: $first, after: $after, createdAfter: $createdAfter, status: $status) {
+        edges { node { orderNumber } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+    '''
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Pages', email='pages@example.com')
+        self.now = timezone.now().replace(microsecond=0)
+        # Three orders share a timestamp: the id breaks the tie
+        for index, hours in enumerate((0, 1, 1, 1, 2, 3, 4)):
+            Order.objects.create(
+                customer=customer, order_number=f'ORD-K{index}', total_amount=Decimal('1.00'),
+                status='completed' if index % 2 else 'pending', created_at=self.now - timedelta(hours=hours),
+            )
+
+    def page_through(self, first, **variables):
+        numbers, after = [], None
+        while True:
+            result = self.query(self.ORDERS, {'first': first, 'after': after, **variables})
+            self.assertNotIn('errors', result)
+            connection = result['data']['allOrders']
+            numbers.extend(edge['node']['orderNumber'] for edge in connection['edges'])
+            if not connection['pageInfo']['hasNextPage']:
+                return numbers
+            after = connection['pageInfo']['endCursor']
+
+    def test_pages_neither_skip_nor_repeat_orders(self):
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('order_number', flat=True))
+        self.assertEqual(len(expected), 7)
+        for first in (1, 2, 3, 7):
+            self.assertEqual(self.page_through(first), expected)
+
+    def test_product_pages(self):
+        for name in ('b', 'a', 'c', 'a', 'b'):
+            Product.objects.create(name=name, price=Decimal('1.00'))
+        expected = [(product.name, str(product.pk)) for product in Product.objects.all()]
+        names, after = [], None
+        while after is not False:
+            connection = self.query(
+                'query ($after: String) { allProducts(first: 2, after: $after) '
+                '{ edges { node { id name } } pageInfo { hasNextPage endCursor } } }',
+                {'after': after},
+            )['data']['allProducts']
+            names.extend((edge['node']['name'], edge['node']['id']) for edge in connection['edges'])
+            after = connection['pageInfo']['hasNextPage'] and connection['pageInfo']['endCursor']
+        self.assertEqual(names, expected)
+
+    def test_created_after_and_status(self):
+        self.assertEqual(self.page_through(2, createdAfter=(self.now - timedelta(hours=1)).isoformat()),
+                         ['ORD-K0', 'ORD-K3', 'ORD-K2', 'ORD-K1'])
+        self.assertEqual(self.page_through(2, status='COMPLETED'), ['ORD-K3', 'ORD-K1', 'ORD-K5'])
+
+    def test_invalid_cursor(self):
+        result = self.query(self.ORDERS, {'first': 2, 'after': 'not-a-cursor'})
+        self.assertEqual(result['errors'][0]['message'], 'Invalid cursor: not-a-cursor')
+        self.assertIsNone(result['data']['allOrders'])
+
+
+class SummaryTests(GraphQLTestCase):
+    def test_orm_writes_keep_the_summary_current(self):
+        customer = Customer.objects.create(first_name='Orm', email='orm@example.com')
+        order = Order.objects.create(customer=customer, order_number='ORD-SUM1', total_amount=Decimal('8.00'))
+        Order.objects.create(customer=customer, order_number='ORD-SUM2', total_amount=Decimal('2.00'))
+        order.status = 'completed'
+        order.total_amount = Decimal('9.00')
+        order.save()
+        self.assertEqual(get_totals(), {
+            'customers': 1, 'orders': 2, 'revenue': Decimal('11.00'),
+            'by_status': {'completed': 1, 'pending': 1},
+        })
+        order.delete()
+        customer.delete()
+        self.assertEqual(get_totals(), {
+            'customers': 0, 'orders': 0, 'revenue': Decimal('0.00'),
+            'by_status': {'completed': 0, 'pending': 0},
+        })
+        self.assertEqual(reconcile(), 0)
+
+    def test_mutations_are_counted_once(self):
+        customer = self.query('mutation { createCustomer(input: {name: "Once", email: "once@example.com"}) '
+                              '{ customer { id } } }')['data']['createCustomer']['customer']
+        product = Product.objects.create(name='Counted', price=Decimal('5.00'), stock=2)
+        self.query('mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } } }',
+                   {'input': {'customerId': customer['id'], 'productIds': [str(product.pk)]}})
+        totals = get_totals()
+        self.assertEqual((totals['customers'], totals['orders'], totals['revenue']), (1, 1, Decimal('5.00')))
+        self.assertEqual(reconcile(), 0)
+
+
+class ResponseCacheSettingsTests(SimpleTestCase):
+    @override_settings(GRAPHQL_RESPONSE_CACHE=True, GRAPHQL_RESPONSE_CACHE_URL=None)
+    def test_enabled_cache_requires_a_url(self):
+        self.assertEqual([error.id for error in response_cache.check_settings()], ['crm.E001'])
+        with self.assertRaises(ImproperlyConfigured):
+            response_cache.get_redis()
+
+    @override_settings(GRAPHQL_RESPONSE_CACHE=True, GRAPHQL_RESPONSE_CACHE_URL='redis://cache:6379/1')
+    def test_configured_url(self):
+        self.assertEqual(response_cache.check_settings(), [])
+        self.assertEqual(response_cache.get_redis().connection_pool.connection_kwargs['host'], 'cache')
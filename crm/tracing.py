@@ -0,0 +1,367 @@
+"""Per-field tracing of GraphQL requests.
+
+A traced request gets a ``Tracer`` that times the parsing, validation and
+execution phases, and ``TracingMiddleware`` records every resolver call with
+the number and total time of the SQL statements run while it was active
+(``sql_hook``, installed with ``connection.execute_wrapper`` on every
+connection). QuerySets a resolver returns are left for GraphQL to evaluate,
+so tracing never changes the SQL it measures; the statements run until the
+next resolver starts are charged to the field that returned the QuerySet.
+
+A request is traced when:
+
+* the client asks for it with ``extensions: {"tracing": true}`` and
+  ``GRAPHQL_TRACING`` is on: the trace is returned in the Apollo tracing
+  format (``extensions.tracing``, durations in nanoseconds) with
+  ``sqlCount`` / ``sqlDuration`` added to each resolver;
+* it is drawn by ``GRAPHQL_TRACING_SAMPLE_RATE``;
+* ``GRAPHQL_TRACING_STRICT`` is on (meant for test settings).
+
+Every trace is added to the per-operation aggregates of ``get_stats()``
+(p50/p95/p99 of the duration, SQL count and SQL time over the last
+``GRAPHQL_TRACING_SAMPLES`` requests, per process), served at
+``/crm/tracing/``.
+
+The same statement run more than ``GRAPHQL_N_PLUS_ONE_THRESHOLD`` times by
+one field of a list's items (e.g. ``allOrders.edges.node.customer``) is an
+N+1 pattern. Traces report them and strict mode raises ``NPlusOneDetected``,
+failing the request and the test that made it.
+"""
+import json
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+TRACING_VERSION = 1
+DEFAULT_SAMPLES = 1000
+DEFAULT_N_PLUS_ONE_THRESHOLD = 3
+# Operation names come from clients: cap how many get their own aggregate
+MAX_OPERATIONS = 500
+OTHER_OPERATIONS = '(other)'
+ANONYMOUS_OPERATION = '(anonymous)'
+
+_tracer = ContextVar('crm_tracer', default=None)
+_field = ContextVar('crm_traced_field', default=None)
+# Field whose unevaluated QuerySet GraphQL is about to iterate
+_pending_field = ContextVar('crm_traced_pending_field', default=None)
+
+
+class NPlusOneDetected(AssertionError):
+    pass
+
+
+class FieldTrace:
+    def __init__(self, info, start_offset):
+        self.path = info.path.as_list()
+        self.parent_type = info.parent_type.name
+        self.field_name = info.field_name
+        self.return_type = str(info.return_type)
+        self.start_offset = start_offset
+        self.duration = 0
+        self.sql_count = 0
+        self.sql_duration = 0
+
+    @property
+    def key(self):
+        """The path without list indices, shared by every item of a list"""
+        return '.'.join(str(part) for part in self.path if not isinstance(part, int))
+
+    @property
+    def in_list(self):
+        return any(isinstance(part, int) for part in self.path)
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'parentType': self.parent_type,
+            'fieldName': self.field_name,
+            'returnType': self.return_type,
+            'startOffset': self.start_offset,
+            'duration': self.duration,
+            'sqlCount': self.sql_count,
+            'sqlDuration': self.sql_duration,
+        }
+
+
+class Tracer:
+    """Timings and SQL statements of one GraphQL request"""
+
+    def __init__(self, report=False):
+        # Whether the trace goes back to the client
+        self.report = report
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.end_time = None
+        self.phases = {}
+        self.fields = []
+        self.sql_count = 0
+        self.sql_duration = 0
+        # (field key, SQL) -> executions, for fields of list items
+        self.statements = defaultdict(int)
+        # Root fields of the ASGI view run on several threads
+        self._lock = threading.Lock()
+
+    def offset(self):
+        return time.perf_counter_ns() - self.start
+
+    @contextmanager
+    def phase(self, name):
+        start = self.offset()
+        try:
+            yield
+        finally:
+            duration = self.offset() - start
+            with self._lock:
+                if name in self.phases:
+                    self.phases[name]['duration'] += duration
+                else:
+                    self.phases[name] = {'startOffset': start, 'duration': duration}
+
+    def start_field(self, info):
+        return FieldTrace(info, self.offset())
+
+    def end_field(self, field):
+        field.duration = self.offset() - field.start_offset
+        with self._lock:
+            self.fields.append(field)
+
+    def record_sql(self, field, sql, duration):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_duration += duration
+            if field is not None:
+                field.sql_count += 1
+                field.sql_duration += duration
+                if field.in_list:
+                    self.statements[field.key, sql] += 1
+
+    def stop(self):
+        self.end = self.offset()
+        self.end_time = datetime.now(timezone.utc)
+
+    def n_plus_one(self):
+        """``[{path, sql, count}]`` for statements repeated per list item"""
+        threshold = getattr(settings, 'GRAPHQL_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+        return [
+            {'path': key, 'sql': sql, 'count': count}
+            for (key, sql), count in self.statements.items()
+            if count > threshold
+        ]
+
+    def as_extension(self):
+        empty = {'startOffset': 0, 'duration': 0}
+        execution = self.phases.get('execution', empty)
+        return {
+            'version': TRACING_VERSION,
+            'startTime': self.start_time.isoformat(),
+            'endTime': self.end_time.isoformat(),
+            'duration': self.end,
+            'parsing': self.phases.get('parsing', empty),
+            'validation': self.phases.get('validation', empty),
+            'execution': {
+                **execution,
+                'resolvers': [
+                    field.as_dict() for field in sorted(self.fields, key=lambda f: f.start_offset)
+                ],
+            },
+            'sqlCount': self.sql_count,
+            'sqlDuration': self.sql_duration,
+            'nPlusOne': self.n_plus_one(),
+        }
+
+
+def is_requested(extensions):
+    """Whether the request extensions ask for ``tracing``"""
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return False
+    return isinstance(extensions, dict) and extensions.get('tracing') is True
+
+
+def start(extensions):
+    """A ``Tracer`` for the request, or None when it is not traced"""
+    report = is_requested(extensions) and getattr(settings, 'GRAPHQL_TRACING', False)
+    if (
+        report
+        or getattr(settings, 'GRAPHQL_TRACING_STRICT', False)
+        or random.random() < getattr(settings, 'GRAPHQL_TRACING_SAMPLE_RATE', 0)
+    ):
+        return Tracer(report=report)
+    return None
+
+
+def current():
+    return _tracer.get()
+
+
+@contextmanager
+def activate(tracer):
+    """Trace what runs in the block (in this context) with ``tracer``"""
+    if tracer is None:
+        yield
+        return
+    token = _tracer.set(tracer)
+    pending_token = _pending_field.set(None)
+    try:
+        yield
+    finally:
+        _pending_field.reset(pending_token)
+        _tracer.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Time a parsing/validation/execution step of the current trace"""
+    tracer = _tracer.get()
+    if tracer is None:
+        yield
+        return
+    with tracer.phase(name):
+        yield
+
+
+def finish(tracer, result, operation_name=None):
+    """Record the trace and attach it to ``result`` if the client asked"""
+    if tracer is None:
+        return result
+    tracer.stop()
+    stats.add(operation_name, tracer)
+    if tracer.report and result is not None:
+        result.extensions = {**(result.extensions or {}), 'tracing': tracer.as_extension()}
+    if getattr(settings, 'GRAPHQL_TRACING_STRICT', False):
+        patterns = tracer.n_plus_one()
+        if patterns:
+            raise NPlusOneDetected(
+                "N+1 queries: " + '; '.join(
+                    f"{pattern['path']} ran {pattern['count']}x: {pattern['sql']}" for pattern in patterns
+                )
+            )
+    return result
+
+
+def sql_hook(execute, sql, params, many, context):
+    """``execute_wrapper`` charging statements to the traced field"""
+    tracer = _tracer.get()
+    if tracer is None:
+        return execute(sql, params, many, context)
+    start_time = time.perf_counter_ns()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        field = _field.get() or _pending_field.get()
+        tracer.record_sql(field, sql, time.perf_counter_ns() - start_time)
+
+
+def install_sql_hook(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``sql_hook`` to the connection"""
+    if sql_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_hook)
+
+
+class TracingMiddleware:
+    """Graphene middleware timing every resolver of the current trace"""
+
+    def resolve(self, next, root, info, **args):
+        tracer = _tracer.get()
+        if tracer is None:
+            return next(root, info, **args)
+        field = tracer.start_field(info)
+        _pending_field.set(None)
+        token = _field.set(field)
+        try:
+            result = next(root, info, **args)
+            if isawaitable(result):
+                return self.resolve_async(tracer, field, result)
+        finally:
+            _field.reset(token)
+        if isinstance(result, QuerySet) and result._result_cache is None:
+            # Evaluating it here would bypass the caller's slicing: charge the
+            # SQL GraphQL runs when it iterates the list to this field instead
+            _pending_field.set(field)
+        tracer.end_field(field)
+        return result
+
+    @staticmethod
+    async def resolve_async(tracer, field, result):
+        token = _field.set(field)
+        try:
+            return await result
+        finally:
+            _field.reset(token)
+            tracer.end_field(field)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        f'p{q}': values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+        for q in (50, 95, 99)
+    }
+
+
+class OperationStats:
+    """Sampled traces of the operations served by this process"""
+
+    def __init__(self):
+        self._operations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, operation_name, tracer):
+        name = operation_name or ANONYMOUS_OPERATION
+        size = getattr(settings, 'GRAPHQL_TRACING_SAMPLES', DEFAULT_SAMPLES)
+        sample = (tracer.end / 1e6, tracer.sql_count, tracer.sql_duration / 1e6)
+        with self._lock:
+            if name not in self._operations and len(self._operations) >= MAX_OPERATIONS:
+                name = OTHER_OPERATIONS
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = {
+                    'count': 0, 'n_plus_one': 0, 'samples': deque(maxlen=size),
+                }
+            operation['count'] += 1
+            operation['n_plus_one'] += bool(tracer.n_plus_one())
+            operation['samples'].append(sample)
+
+    def get(self):
+        with self._lock:
+            operations = {
+                name: (operation['count'], operation['n_plus_one'], list(operation['samples']))
+                for name, operation in self._operations.items()
+            }
+        return {
+            name: {
+                'count': count,
+                'n_plus_one': n_plus_one,
+                'samples': len(samples),
+                'duration_ms': percentiles([sample[0] for sample in samples]),
+                'sql_count': percentiles([sample[1] for sample in samples]),
+                'sql_ms': percentiles([sample[2] for sample in samples]),
+            }
+            for name, (count, n_plus_one, samples) in operations.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._operations.clear()
+
+
+stats = OperationStats()
+
+
+def get_stats():
+    """Per-operation aggregates, e.g. ``{'GetOrders': {'duration_ms': {'p50': ...}}}``"""
+    return stats.get()
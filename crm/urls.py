@@ -4,6 +4,7 @@ from . import views
 app_name = 'crm'
 
 urlpatterns = [
-    # Add your CRM app URLs here
-    # Example: path('customers/', views.customer_list, name='customer_list'),
+    path('customers/', views.customer_list, name='customer_list'),
+    path('orders/', views.order_list, name='order_list'),
+    path('tracing/', views.tracing_stats, name='tracing_stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Static query cost and depth limits applied before execution.
+
+Every field has a static cost (1 for fields returning objects, 0 for
+scalars, overridable through ``GRAPHQL_FIELD_COSTS``) which is multiplied by
+the number of times it is expected to resolve: connection fields use their
+``first`` argument (or the page size cap) and plain lists use
+``GRAPHQL_DEFAULT_LIST_SIZE``. Operations above ``GRAPHQL_MAX_QUERY_COST``
+or deeper than ``GRAPHQL_MAX_QUERY_DEPTH`` are rejected without running any
+resolver.
+"""
+from django.conf import settings
+from graphene.validation import depth_limit_validator
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, get_named_type, get_nullable_type, is_leaf_type, is_list_type
+from graphql.language import (
+    FieldNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    VariableNode,
+)
+from graphql.validation import ValidationRule, specified_rules
+
+DEFAULT_MAX_QUERY_DEPTH = 10
+DEFAULT_MAX_QUERY_COST = 10000
+DEFAULT_LIST_SIZE = 10
+
+
+def get_limits():
+    return {
+        'max_depth': getattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH', DEFAULT_MAX_QUERY_DEPTH),
+        'max_cost': getattr(settings, 'GRAPHQL_MAX_QUERY_COST', DEFAULT_MAX_QUERY_COST),
+        'list_size': getattr(settings, 'GRAPHQL_DEFAULT_LIST_SIZE', DEFAULT_LIST_SIZE),
+        'field_costs': getattr(settings, 'GRAPHQL_FIELD_COSTS', {}),
+    }
+
+
+class CostCalculator:
+    """Compute the static cost of one operation"""
+
+    def __init__(self, context, variables=None, list_size=DEFAULT_LIST_SIZE,
+                 field_costs=None, max_page_size=None):
+        self.context = context
+        self.schema = context.schema
+        self.variables = variables or {}
+        self.list_size = list_size
+        self.field_costs = field_costs or {}
+        self.max_page_size = max_page_size or graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    def operation_cost(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return 0
+        return self.selection_cost(operation.selection_set, root_type, 1, None, frozenset())
+
+    def page_size(self, field_node, field_def):
+        """Value of the ``first`` argument, or None if the field has none"""
+        if 'first' not in field_def.args:
+            return None
+        for argument in field_node.arguments:
+            if argument.name.value != 'first':
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                return int(value.value)
+            if isinstance(value, VariableNode):
+                variable = self.variables.get(value.name.value)
+                if isinstance(variable, int):
+                    return variable
+        return self.max_page_size
+
+    def field_cost(self, parent_type, field_name, field_type):
+        key = f"{parent_type.name}.{field_name}"
+        if key in self.field_costs:
+            return self.field_costs[key]
+        return 0 if is_leaf_type(get_named_type(field_type)) else 1
+
+    def selection_cost(self, selection_set, parent_type, multiplier, page_size, fragments):
+        if selection_set is None:
+            return 0
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self.field_node_cost(selection, parent_type, multiplier, page_size, fragments)
+            elif isinstance(selection, InlineFragmentNode):
+                type_ = parent_type
+                if selection.type_condition is not None:
+                    type_ = self.schema.get_type(selection.type_condition.name.value) or parent_type
+                cost += self.selection_cost(selection.selection_set, type_, multiplier, page_size, fragments)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is None or name in fragments:
+                    continue
+                type_ = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+                cost += self.selection_cost(
+                    fragment.selection_set, type_, multiplier, page_size, fragments | {name}
+                )
+        return cost
+
+    def field_node_cost(self, field_node, parent_type, multiplier, page_size, fragments):
+        name = field_node.name.value
+        fields = getattr(parent_type, 'fields', None)
+        if name.startswith('__') or not fields or name not in fields:
+            # Introspection and unknown fields (reported by other rules)
+            return 0
+        field_def = fields[name]
+        field_type = field_def.type
+        cost = self.field_cost(parent_type, name, field_type) * multiplier
+
+        child_multiplier = multiplier
+        if is_list_type(get_nullable_type(field_type)):
+            size = page_size if page_size is not None else self.list_size
+            child_multiplier = multiplier * size
+        return cost + self.selection_cost(
+            field_node.selection_set,
+            get_named_type(field_type),
+            child_multiplier,
+            self.page_size(field_node, field_def),
+            fragments,
+        )
+
+
+def query_cost_validator(max_cost, variables=None, operation_name=None,
+                         list_size=DEFAULT_LIST_SIZE, field_costs=None, callback=None):
+    """Build a validation rule rejecting operations costing more than ``max_cost``"""
+
+    class QueryCostValidator(ValidationRule):
+        def enter_operation_definition(self, node: OperationDefinitionNode, *_args):
+            name = node.name.value if node.name else None
+            if operation_name and name != operation_name:
+                return
+            calculator = CostCalculator(
+                self.context, variables=variables, list_size=list_size,
+                field_costs=field_costs,
+            )
+            cost = calculator.operation_cost(node)
+            if callable(callback):
+                callback({'requested': cost, 'maximum': max_cost})
+            if max_cost is not None and cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum allowed cost of {max_cost}.",
+                    [node],
+                ))
+
+    return QueryCostValidator
+
+
+def static_rules(max_depth=None):
+    """Standard rules plus the depth limit; they only depend on the document"""
+    if max_depth is None:
+        max_depth = get_limits()['max_depth']
+    return [*specified_rules, depth_limit_validator(max_depth=max_depth)]
+
+
+def cost_rules(variables=None, operation_name=None, callback=None):
+    """The cost limit, which also depends on the request variables"""
+    limits = get_limits()
+    return [
+        query_cost_validator(
+            limits['max_cost'],
+            variables=variables,
+            operation_name=operation_name,
+            list_size=limits['list_size'],
+            field_costs=limits['field_costs'],
+            callback=callback,
+        ),
+    ]
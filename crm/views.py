@@ -1,20 +1,406 @@
+import json
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.middleware.csrf import get_token
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+from graphql.error import GraphQLError
+from graphql.validation import validate
+from . import tracing
+from .async_execution import AsyncExecutionContext
 from .models import Customer, Order
+from .pagination import decode_cursor, encode_cursor, keyset_filter, keyset_ordering
+from .persisted import document_cache, resolve_query
+from .response_cache import execute_cached, is_cacheable
+from .routing import use_replicas
+from .validation import cost_rules
 
 
-def customer_list(request):
-    """API view to list all customers"""
-    customers = Customer.objects.all().values(
-        'id', 'first_name', 'last_name', 'email', 'phone', 'is_active'
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+export_encoder = DjangoJSONEncoder()
+
+
+def _encode_rows(rows):
+    return ''.join(export_encoder.encode(row) + '\n' for row in rows)
+
+
+def stream_export(request, queryset, fields):
+    """Stream ``queryset.values(*fields)`` as JSON or NDJSON, in keyset order.
+
+    Query parameters:
+
+    * ``format=ndjson`` (or ``Accept: application/x-ndjson``) writes one row
+      per line followed by a ``{"next": ...}`` line; otherwise the body is
+      ``{"results": [...], "next": ...}``.
+    * ``limit`` caps the number of rows; ``next`` is then the cursor to pass
+      as ``after`` for the following page (null once the export is done).
+
+    Rows are read with ``.iterator()`` and written chunk by chunk, so memory
+    use does not grow with the size of the export.
+    """
+    model = queryset.model
+    ordering = keyset_ordering(model)
+    cursor_fields = [name for name, _ in ordering]
+    try:
+        limit = request.GET.get('limit')
+        limit = int(limit) if limit else None
+        if limit is not None and limit <= 0:
+            raise ValueError(limit)
+    except ValueError:
+        return JsonResponse({'error': "limit must be a positive integer"}, status=400)
+
+    queryset = queryset.order_by(
+        *[('-' if descending else '') + name for name, descending in ordering]
+    )
+    after = request.GET.get('after')
+    if after:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, decode_cursor(after, model)))
+        except GraphQLError as e:
+            return JsonResponse({'error': e.message}, status=400)
+    if limit is not None:
+        # One extra row tells whether there is a next page
+        queryset = queryset[:limit + 1]
+
+    ndjson = (
+        request.GET.get('format') == 'ndjson'
+        or 'application/x-ndjson' in request.headers.get('Accept', '')
     )
-    return JsonResponse(list(customers), safe=False)
+    chunk_size = getattr(settings, 'CRM_EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+    rows = queryset.values(*fields, *[name for name in cursor_fields if name not in fields])
+
+    def generate():
+        yield '' if ndjson else '{"results": ['
+        chunk = []
+        count = 0
+        last = None
+        for row in rows.iterator(chunk_size=chunk_size):
+            if limit is not None and count == limit:
+                break
+            if ndjson:
+                chunk.append(row)
+            else:
+                chunk.append(('' if count == 0 else ',') + export_encoder.encode(row))
+            count += 1
+            last = row
+            if len(chunk) >= chunk_size:
+                yield _encode_rows(chunk) if ndjson else ''.join(chunk)
+                chunk = []
+        else:
+            last = None  # Exhausted: no next page
+        if chunk:
+            yield _encode_rows(chunk) if ndjson else ''.join(chunk)
+        next_cursor = encode_cursor([last[name] for name in cursor_fields]) if last else None
+        if ndjson:
+            yield json.dumps({'next': next_cursor}) + '\n'
+        else:
+            yield '], "next": ' + json.dumps(next_cursor) + '}'
+
+    return StreamingHttpResponse(
+        generate(),
+        content_type='application/x-ndjson' if ndjson else 'application/json',
+    )
+
+
+@staff_member_required
+def customer_list(request):
+    """API view to export all customers (staff only: emails and phones)"""
+    return stream_export(request, Customer.objects.all(), [
+        'id', 'first_name', 'last_name', 'email', 'phone', 'is_active', 'created_at'
+    ])
 
 
+@staff_member_required
 def order_list(request):
-    """API view to list all orders"""
-    orders = Order.objects.select_related('customer').all().values(
+    """API view to export all orders (staff only)"""
+    return stream_export(request, Order.objects.all(), [
         'id', 'order_number', 'total_amount', 'status',
         'customer__first_name', 'customer__last_name', 'created_at'
-    )
-    return JsonResponse(list(orders), safe=False)
\ No newline at end of file
+    ])
+
+
+@staff_member_required
+def tracing_stats(request):
+    """Sampled GraphQL timings of this process, per operation name"""
+    return JsonResponse({'operations': tracing.get_stats()})
+
+
+class Operation:
+    """A parsed, validated and costed GraphQL operation, ready to execute"""
+
+    def __init__(self, schema, document, operation_ast, variables, operation_name):
+        self.schema = schema
+        self.document = document
+        self.operation_ast = operation_ast
+        self.variables = variables
+        self.operation_name = operation_name
+        # Returned to the client in the response extensions
+        self.extensions = {}
+
+    @property
+    def name(self):
+        if self.operation_name or self.operation_ast is None or self.operation_ast.name is None:
+            return self.operation_name
+        return self.operation_ast.name.value
+
+    @property
+    def is_query(self):
+        return self.operation_ast is not None and self.operation_ast.operation == OperationType.QUERY
+
+    def finish(self, result):
+        result.extensions = {**(result.extensions or {}), **self.extensions} or None
+        return result
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQL endpoint with persisted queries, a document cache and limits.
+
+    Whatever the request pipeline learns about the operation (e.g. its cost)
+    is returned to the client in the response ``extensions`` block, and so
+    is the resolver trace when tracing is requested (see crm/tracing.py).
+    """
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name,
+                                show_graphiql=False):
+        tracer = tracing.start(self.get_request_extensions(request, data))
+        with tracing.activate(tracer):
+            operation = self.prepare_operation(request, data, query, variables, operation_name,
+                                               show_graphiql)
+            if not isinstance(operation, Operation):
+                return tracing.finish(tracer, operation, operation_name)
+            result = self.run_operation(request, operation)
+        return tracing.finish(tracer, result, operation.name)
+
+    def prepare_operation(self, request, data, query, variables, operation_name,
+                          show_graphiql=False):
+        """Return an ``Operation``, or the ``ExecutionResult`` (``None`` for GraphiQL) to respond with"""
+        try:
+            query, digest = resolve_query(query, self.get_request_extensions(request, data))
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, validation_errors = document_cache.get(schema, query, digest)
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        operation = Operation(schema, document, operation_ast, variables, operation_name)
+        with tracing.phase('validation'):
+            validation_errors = validate(
+                schema,
+                document,
+                cost_rules(
+                    variables=variables,
+                    operation_name=operation_name,
+                    callback=lambda cost: operation.extensions.update(cost=cost),
+                ),
+            )
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors,
+                                   extensions=operation.extensions)
+        return operation
+
+    def run_operation(self, request, operation):
+        """Execute ``operation``, through the response cache when it applies"""
+        schema, document = operation.schema, operation.document
+        with tracing.phase('execution'):
+            if is_cacheable(document, operation.operation_ast):
+                result, cache_status = execute_cached(
+                    request, schema, document, operation.operation_name, operation.variables,
+                    lambda middleware: self.execute_document(
+                        request, schema, document, operation.operation_ast, operation.variables,
+                        operation.operation_name, extra_middleware=middleware,
+                    ),
+                )
+                if cache_status:
+                    operation.extensions['responseCache'] = cache_status
+            else:
+                result = self.execute_document(request, schema, document, operation.operation_ast,
+                                               operation.variables, operation.operation_name)
+        return operation.finish(result)
+
+    def get_execute_options(self, request, variables, operation_name, extra_middleware=()):
+        middleware = self.get_middleware(request)
+        if tracing.current() is not None:
+            extra_middleware = [*extra_middleware, tracing.TracingMiddleware()]
+        if extra_middleware:
+            middleware = [*(middleware or []), *extra_middleware]
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": middleware,
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_document(self, request, schema, document, operation_ast, variables,
+                         operation_name, extra_middleware=()):
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name,
+                                                       extra_middleware)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+                # Read-only: served by a read replica when one is configured
+                with use_replicas():
+                    return execute(schema, document, **execute_options)
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    def get_request_extensions(request, data):
+        return request.GET.get('extensions') or data.get('extensions')
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id=None, show_graphiql=False):
+        """Return ``(json, status_code)`` for ``execution_result``"""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, 'path', None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+
+        if execution_result.extensions:
+            response['extensions'] = execution_result.extensions
+
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """``CRMGraphQLView`` for ASGI, executing queries on the event loop.
+
+    Root fields of a query resolve concurrently (see crm/async_execution.py),
+    so a slow field no longer holds a worker thread while the others wait.
+    Mutations, response-cached queries, batches and GraphiQL keep the
+    synchronous code path, on the request's thread.
+    """
+
+    view_is_async = True
+    async_execution_context_class = AsyncExecutionContext
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.batch or request.method.lower() not in ('get', 'post'):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+        # What @ensure_csrf_cookie does for the synchronous view
+        get_token(request)
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            tracer = tracing.start(self.get_request_extensions(request, data))
+            with tracing.activate(tracer):
+                operation = self.prepare_operation(request, data, query, variables, operation_name)
+                if not isinstance(operation, Operation):
+                    result = operation
+                elif operation.is_query and not is_cacheable(operation.document, operation.operation_ast):
+                    result = operation.finish(await self.execute_query(request, operation))
+                else:
+                    result = await sync_to_async(self.run_operation)(request, operation)
+            if isinstance(operation, Operation):
+                operation_name = operation.name
+            result = tracing.finish(tracer, result, operation_name)
+
+            content, status_code = self.build_response(request, result, id)
+            return HttpResponse(status=status_code, content=content, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def execute_query(self, request, operation):
+        try:
+            execute_options = self.get_execute_options(request, operation.variables,
+                                                       operation.operation_name)
+            execute_options["execution_context_class"] = self.async_execution_context_class
+            # Read-only: served by a read replica when one is configured
+            with use_replicas(), tracing.phase('execution'):
+                result = execute(operation.schema, operation.document, **execute_options)
+                if isawaitable(result):
+                    result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
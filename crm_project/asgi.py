@@ -0,0 +1,13 @@
+"""ASGI config for crm_project.
+
+Serves the same URLs as ``wsgi.py``; ``/graphql/async/`` is the GraphQL
+endpoint that executes queries on the event loop.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm_project.settings')
+
+application = get_asgi_application()
@@ -0,0 +1,98 @@
+"""Database profiles selected through environment variables (python-decouple).
+
+``DB_ENGINE=sqlite`` (the default) is the local and test profile: a SQLite
+file in WAL mode with ``synchronous=NORMAL`` and a busy timeout, so readers
+no longer block the writer (see ``crm_project/db/sqlite3``).
+
+``DB_ENGINE=postgres`` is the production profile, configured with ``DB_NAME``,
+``DB_USER``, ``DB_PASSWORD``, ``DB_HOST`` and ``DB_PORT``. Connections are kept
+open for ``DB_CONN_MAX_AGE`` seconds and checked before reuse
+(``CONN_HEALTH_CHECKS``). With ``DB_POOL_SIZE`` > 0 connections are instead
+returned to an in-process pool shared by all threads when a request ends
+(see ``crm_project/db/postgresql``).
+
+``DB_REPLICAS`` lists read replicas of that database, comma-separated: hosts
+(``host`` or ``host:port``) for PostgreSQL, file paths for the SQLite
+stand-ins. They become the ``replica_1``, ``replica_2``... aliases used by
+``crm.routing.ReplicaRouter``.
+
+Values can also be put in a ``.env`` file next to ``manage.py``.
+"""
+from decouple import Csv, config
+
+DEFAULT_CONN_MAX_AGE = 60
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'temp_store': 'memory',
+    # Negative: KiB, so 20MB of page cache per connection
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+
+def sqlite_settings(base_dir):
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas['busy_timeout'] = config('DB_BUSY_TIMEOUT', default=5000, cast=int)
+    return {
+        'ENGINE': 'crm_project.db.sqlite3',
+        'NAME': config('DB_NAME', default=str(base_dir / 'db.sqlite3')),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=DEFAULT_CONN_MAX_AGE, cast=int),
+        'OPTIONS': {'pragmas': pragmas},
+    }
+
+
+def postgres_settings():
+    pool_size = config('DB_POOL_SIZE', default=0, cast=int)
+    options = {
+        'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        'application_name': config('DB_APPLICATION_NAME', default='crm'),
+    }
+    if pool_size:
+        options['pool_size'] = pool_size
+    return {
+        'ENGINE': 'crm_project.db.postgresql' if pool_size else 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='crm'),
+        'USER': config('DB_USER', default='crm'),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        # With a pool, "closing" at the end of a request just returns the connection
+        'CONN_MAX_AGE': 0 if pool_size else config(
+            'DB_CONN_MAX_AGE', default=DEFAULT_CONN_MAX_AGE, cast=int,
+        ),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': options,
+    }
+
+
+def database_settings(base_dir):
+    """The ``DATABASES['default']`` entry for the ``DB_ENGINE`` profile"""
+    engine = config('DB_ENGINE', default='sqlite')
+    if engine in ('postgres', 'postgresql'):
+        return postgres_settings()
+    if engine == 'sqlite':
+        return sqlite_settings(base_dir)
+    raise ValueError(f"Unknown DB_ENGINE: {engine} (use 'sqlite' or 'postgres')")
+
+
+def replica_settings(base_dir):
+    """``{alias: settings}`` for the read replicas listed in ``DB_REPLICAS``"""
+    primary = database_settings(base_dir)
+    replicas = {}
+    for index, location in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+        replica = {
+            **primary,
+            'OPTIONS': dict(primary['OPTIONS']),
+            # Tests read the test copy of the primary instead
+            'TEST': {'MIRROR': 'default'},
+        }
+        if primary['ENGINE'] == 'crm_project.db.sqlite3':
+            replica['NAME'] = location
+        else:
+            host, _, port = location.partition(':')
+            replica['HOST'] = host
+            replica['PORT'] = port or primary['PORT']
+        replicas[f'replica_{index}'] = replica
+    return replicas
@@ -0,0 +1,80 @@
+"""PostgreSQL backend keeping closed connections in an in-process pool.
+
+Django 4.2 has no connection pool: with ``CONN_MAX_AGE`` each thread keeps
+its own connection, and threads that come and go (or ``CONN_MAX_AGE = 0``)
+pay for a new connection, TLS and authentication on every request. Here
+``close()`` puts the connection back into a pool of up to
+``OPTIONS['pool_size']`` idle connections shared by every thread of the
+process, and the next ``connect()`` takes one from it (after a ``SELECT 1``
+when ``CONN_HEALTH_CHECKS`` is on).
+"""
+import queue
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, size):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = queue.LifoQueue(maxsize=size)
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        size = self.settings_dict['OPTIONS'].get('pool_size', 0)
+        key = (self.alias, self.settings_dict['HOST'], self.settings_dict['PORT'],
+               self.settings_dict['NAME'], self.settings_dict['USER'])
+        return get_pool(key, size)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool_size', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        while True:
+            try:
+                connection = pool.get_nowait()
+            except queue.Empty:
+                return super().get_new_connection(conn_params)
+            if connection.closed:
+                continue
+            if self.settings_dict['CONN_HEALTH_CHECKS'] and not self._ping(connection):
+                connection.close()
+                continue
+            return connection
+
+    def _ping(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        connection = self.connection
+        if connection is None:
+            return
+        with self.wrap_database_errors:
+            if connection.closed:
+                return
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                # The server connection is gone
+                return connection.close()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            try:
+                self.pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
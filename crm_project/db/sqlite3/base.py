@@ -0,0 +1,17 @@
+"""SQLite backend applying ``OPTIONS['pragmas']`` to every new connection"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            if name == 'journal_mode' and self.is_in_memory_db():
+                continue
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
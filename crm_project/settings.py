@@ -2,6 +2,8 @@
 
 from pathlib import Path
 
+from crm_project.db import database_settings, replica_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,6 +34,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'crm.routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,15 +58,23 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'crm_project.wsgi.application'
+ASGI_APPLICATION = 'crm_project.asgi.application'
 
-# Database
+# Database: SQLite (WAL) by default, PostgreSQL with DB_ENGINE=postgres
+# (see crm_project/db/__init__.py for the environment variables)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(BASE_DIR),
+    **replica_settings(BASE_DIR),
 }
 
+# GraphQL queries read from the DB_REPLICAS, everything else from default
+# (see crm/routing.py)
+DATABASE_ROUTERS = ['crm.routing.ReplicaRouter']
+CRM_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+CRM_DB_REPLICA_MAX_LAG = 5
+CRM_DB_REPLICA_CHECK_INTERVAL = 10
+CRM_DB_PIN_SECONDS = 10
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -97,6 +108,74 @@ GRAPHENE = {
     'SCHEMA': 'crm.schema.schema'
 }
 
+# GraphQL query limits (see crm/validation.py)
+GRAPHQL_MAX_QUERY_DEPTH = 10
+GRAPHQL_MAX_QUERY_COST = 10000
+GRAPHQL_DEFAULT_LIST_SIZE = 10
+GRAPHQL_FIELD_COSTS = {}
+
+# Persisted queries (see crm/persisted.py)
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+GRAPHQL_PERSISTED_QUERIES_ONLY = False
+GRAPHQL_PERSISTED_QUERIES_FILE = None
+
+# ASGI view (/graphql/async/): idle threads kept for the concurrently resolved
+# root fields of a query (see crm/async_execution.py)
+GRAPHQL_ASYNC_IDLE_THREADS = 16
+
+# Resolver tracing (see crm/tracing.py): per-field timings and SQL in the
+# response extensions when a client sends {"tracing": true}, a sampled share of
+# requests aggregated per operation at /crm/tracing/ (staff only), and strict
+# mode, for tests, failing requests that run an N+1 query pattern.
+GRAPHQL_TRACING = False
+GRAPHQL_TRACING_SAMPLE_RATE = 0.0
+GRAPHQL_TRACING_SAMPLES = 1000
+GRAPHQL_TRACING_STRICT = False
+GRAPHQL_N_PLUS_ONE_THRESHOLD = 3
+
+# Response cache for read-only queries (see crm/response_cache.py). Opt-in:
+# only operations whose root fields are all listed are cached. Turning it on
+# requires GRAPHQL_RESPONSE_CACHE_URL (a Redis URL, e.g. redis://localhost:6379/1).
+GRAPHQL_RESPONSE_CACHE = False
+GRAPHQL_RESPONSE_CACHE_URL = None
+GRAPHQL_RESPONSE_CACHE_TTL = 300
+GRAPHQL_RESPONSE_CACHE_LOCK_TIMEOUT = 5
+GRAPHQL_RESPONSE_CACHE_FIELDS = ['allProducts', 'lowStockProducts', 'product']
+
+# Closed sales-stats buckets and rankings (see crm/analytics.py). Opt-in: kept
+# without expiry in a cache alias shared by all processes (e.g. Redis); with a
+# per-process LocMemCache they expire after CRM_SALES_STATS_CACHE_TTL seconds.
+CRM_SALES_STATS_CACHE = False
+CRM_SALES_STATS_CACHE_ALIAS = 'default'
+CRM_SALES_STATS_CACHE_TTL = 300
+
+# Shared tier of the customer/order/product entity cache (see crm/entity_cache.py).
+# Opt-in: use a cache alias shared by all processes (e.g. Redis) in production.
+CRM_ENTITY_CACHE = False
+CRM_ENTITY_CACHE_ALIAS = 'default'
+CRM_ENTITY_CACHE_TTL = 60
+
+# Rows per INSERT / IN (...) chunk (and per transaction for bulkCreateOrders)
+CRM_BULK_CREATE_BATCH_SIZE = 500
+
+# Rows fetched per database round trip by the streamed /crm/ list exports
+CRM_EXPORT_CHUNK_SIZE = 2000
+# Where crm.tasks.export_crm_data writes its partition files (None: <tmp>/crm_exports)
+CRM_EXPORT_DIR = None
+
+# How cron jobs and workers reach the GraphQL API: 'local' executes in-process,
+# 'http' goes through CRM_GRAPHQL_URL (see crm/graphql_client.py)
+CRM_GRAPHQL_TRANSPORT = 'local'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql/'
+# Shared HTTP session: seconds, connection retries with exponential backoff
+# (requests that reached the server are never re-sent), keep-alive pool
+CRM_GRAPHQL_TIMEOUT = 30
+CRM_GRAPHQL_RETRIES = 3
+CRM_GRAPHQL_RETRY_BACKOFF = 0.5
+CRM_GRAPHQL_POOL_SIZE = 4
+# Where the introspected schema is cached (keyed by schema hash); None = tmp dir
+CRM_GRAPHQL_SCHEMA_CACHE_DIR = None
+
 # Cron Jobs Configuration
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),